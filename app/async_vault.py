@@ -0,0 +1,151 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+class AsyncVault:
+    def __init__(self, vault, executor=None):
+        """
+        Wraps a Vault with an asyncio API. Every call, including the encryption
+        work and file or database I/O, runs in an executor so the event loop is
+        never blocked.
+
+        A plain Vault is not thread-safe, so by default calls are serialized on a
+        single worker thread. Pass a wider executor together with a
+        ConcurrentVault to run calls in parallel.
+
+        :param vault: The Vault to wrap.
+        :param executor: A concurrent.futures executor. Defaults to one worker thread.
+        """
+        self.vault = vault
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="vault")
+
+    async def create_item(self, item_type, fields):
+        """
+        Creates a new item in the vault.
+
+        :param item_type: The type of the item (e.g., 'Login', 'Credit Card').
+        :param fields: A dictionary of fields (e.g., username, password, etc.).
+        :return: The ID of the created item.
+        :raises ValueError: If a field value is not a string.
+        """
+        return await self._run(self.vault.create_item, item_type, fields)
+
+    async def modify_item(self, item_id, fields):
+        """
+        Modifies an existing item in the vault.
+
+        :param item_id: The ID of the item to modify.
+        :param fields: A dictionary of fields to update.
+        :raises KeyError: If the item is not in the vault.
+        :raises ValueError: If a field value is not a string.
+        """
+        return await self._run(self.vault.modify_item, item_id, fields)
+
+    async def delete_item(self, item_id):
+        """
+        Deletes an item from the vault.
+
+        :param item_id: The ID of the item to delete.
+        :raises KeyError: If the item is not in the vault.
+        """
+        return await self._run(self.vault.delete_item, item_id)
+
+    async def retrieve_item(self, item_id):
+        """
+        Retrieves and decrypts an item from the vault.
+
+        :param item_id: The ID of the item to retrieve.
+        :return: The decrypted item or None if the item is not found.
+        """
+        return await self._run(self.vault.retrieve_item, item_id)
+
+    async def retrieve_items(self, item_ids, workers=None):
+        """
+        Retrieves and decrypts several items, optionally across worker processes.
+
+        :param item_ids: An iterable of item IDs.
+        :param workers: Number of worker processes. None or 1 decrypts in the executor thread.
+        :return: A dictionary of item ID -> decrypted item.
+        """
+        return await self._run(self.vault.retrieve_items, list(item_ids), workers)
+
+    async def list_items(self):
+        """
+        Lists all items in the vault.
+
+        :return: A list of item IDs and types.
+        """
+        return await self._run(self.vault.list_items)
+
+    async def find(self, type=None, **fields):
+        """
+        Finds items by type and/or blind-indexed field values.
+
+        :param type: The item type to match, or None for any type.
+        :param fields: Indexed field names and the values to match.
+        :return: A list of matching item IDs.
+        """
+        return await self._run(self.vault.find, type, **fields)
+
+    async def search(self, query, limit=10, min_score=0.5):
+        """
+        Fuzzy searches the searchable fields.
+
+        :param query: The (partial) text to look for.
+        :param limit: Maximum number of item IDs returned.
+        :param min_score: Minimum fraction of the query's trigrams an item must contain.
+        :return: A list of item IDs, best match first.
+        """
+        return await self._run(self.vault.search, query, limit, min_score)
+
+    async def save_to_file(self, file_path, format="json"):
+        """
+        Saves the vault data to a file.
+
+        :param file_path: The path of the file to save to.
+        :param format: 'json' or 'binary'.
+        """
+        return await self._run(self.vault.save_to_file, file_path, format)
+
+    async def load_from_file(self, file_path):
+        """
+        Loads the vault data from a file.
+
+        :param file_path: The path of the file to load from.
+        """
+        return await self._run(self.vault.load_from_file, file_path)
+
+    async def close(self):
+        """
+        Closes the vault's storage and shuts down the executor if it was created here.
+        """
+        await self._run(self.vault.close)
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+
+# Example usage
+if __name__ == "__main__":
+    from cryptography.fernet import Fernet
+    from vault import Vault
+
+    async def demo():
+        async with AsyncVault(Vault(Fernet.generate_key(), item_encryption="item")) as vault:
+            item_ids = await asyncio.gather(*(vault.create_item("Login", {"username": f"user{n}"}) for n in range(5)))
+            items = await asyncio.gather(*(vault.retrieve_item(item_id) for item_id in item_ids))
+            print("Retrieved items:", items)
+            await vault.save_to_file("async_vault.json")
+
+    asyncio.run(demo())
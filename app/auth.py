@@ -1,26 +1,211 @@
-import hashlib
+import heapq
+import itertools
+import secrets
+import threading
+import time
+import weakref
+from kdf import derive_key, verify_key
+from secure_memory import SecretBuffer
+from user_store import UserStore
+
+# Account database used when no user store is set
+USER_DB_FILE = "users.db"
 
 class UserSession:
-    _instance = None
+    def __init__(self, user_store=None):
+        """
+        Initializes the session of one user. A process can hold any number of
+        sessions, e.g. one per connected user of a server.
 
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super(UserSession, cls).__new__(cls)
-            cls._instance.user = None
-        return cls._instance
+        :param user_store: The UserStore to check logins against. Defaults to one opened on USER_DB_FILE.
+        """
+        self.user = None
+        self.user_store = user_store
+        self.idle_timeout = 300
+        self.token_ttl = 60
+        self._key = None
+        self._tokens = {}
+        self._last_used = 0
+        self._idle_check_pending = False
+        self._lock = threading.RLock()
 
     def login(self, email, password):
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        if self._validate_credentials(email, hashed_password):
+        if self._validate_credentials(email, password):
             self.user = email
             print("Logged in successfully!")
         else:
             print("Invalid credentials.")
 
     def logout(self):
+        self.lock()
         self.user = None
         print("Logged out.")
 
-    def _validate_credentials(self, email, hashed_password):
-        # Logic to check the credentials from a database
-        return True  # Placeholder
+    def unlock(self, master_password, kdf_params, idle_timeout=300):
+        """
+        Derives the vault key from the master password, once per session. The
+        key is kept in a locked, zeroizable buffer until the session is locked
+        or has been idle for `idle_timeout` seconds.
+
+        :param master_password: The master password.
+        :param kdf_params: The key derivation parameters from the vault header.
+        :param idle_timeout: Seconds without use after which the key is wiped.
+        :return: An unlock token for the first operation.
+        """
+        key = derive_key(master_password, kdf_params)
+        if not verify_key(key, kdf_params):
+            raise ValueError("Wrong master password.")
+        with self._lock:
+            self.lock()
+            self._key = SecretBuffer(key)
+            self.idle_timeout = idle_timeout
+            self._touch()
+            return self.issue_token()
+
+    def issue_token(self, ttl=None):
+        """
+        Hands out a short-lived token that lets an operation use the session key
+        without deriving it again.
+
+        :param ttl: Seconds the token stays valid. Defaults to `token_ttl`.
+        :return: The token (str).
+        """
+        with self._lock:
+            if not self.is_unlocked:
+                raise ValueError("The session is locked.")
+            self._forget_expired_tokens()
+            token = secrets.token_urlsafe(32)
+            self._tokens[token] = time.monotonic() + (self.token_ttl if ttl is None else ttl)
+            return token
+
+    def key_for(self, token):
+        """
+        Returns the session key for a valid unlock token.
+
+        :param token: A token from unlock() or issue_token().
+        :return: The vault key (bytes).
+        """
+        with self._lock:
+            expires_at = self._tokens.get(token)
+            if expires_at is None or time.monotonic() >= expires_at or not self.is_unlocked:
+                raise ValueError("Invalid or expired unlock token.")
+            self._touch()
+            return self._key.get()
+
+    def open_vault(self, token, **options):
+        """
+        Builds a Vault from the session key, skipping key derivation.
+
+        :param token: A valid unlock token.
+        :param options: Any Vault option (item_encryption, storage, ...).
+        :return: The Vault.
+        """
+        from vault import Vault
+        return Vault(self.key_for(token), **options)
+
+    @property
+    def is_unlocked(self):
+        return self._key is not None and not self._key.wiped
+
+    def lock(self):
+        """
+        Wipes the session key and revokes every unlock token.
+        """
+        with self._lock:
+            if self._key is not None:
+                self._key.wipe()
+                self._key = None
+            self._tokens.clear()
+
+    def _touch(self):
+        self._last_used = time.monotonic()
+        if not self._idle_check_pending:
+            self._schedule_idle_check(self.idle_timeout)
+
+    def _schedule_idle_check(self, delay):
+        self._idle_check_pending = True
+        _idle_watcher.schedule(self, time.monotonic() + delay)
+
+    def _check_idle(self):
+        with self._lock:
+            self._idle_check_pending = False
+            if not self.is_unlocked:
+                return
+            idle = time.monotonic() - self._last_used
+            if idle >= self.idle_timeout:
+                self.lock()
+                print("Session locked after inactivity.")
+            else:
+                # Used since the timer was set; check again when the new idle period ends
+                self._schedule_idle_check(self.idle_timeout - idle)
+
+    def _forget_expired_tokens(self):
+        now = time.monotonic()
+        for token in [token for token, expires_at in self._tokens.items() if now >= expires_at]:
+            del self._tokens[token]
+
+    def _validate_credentials(self, email, password):
+        # Check the credentials against the user database (salted scrypt hashes)
+        if self.user_store is None:
+            self.user_store = UserStore(USER_DB_FILE)
+        return self.user_store.verify(email, password)
+
+
+class _IdleWatcher:
+    def __init__(self):
+        """
+        Runs the idle checks of every session on one background thread, so a
+        process with thousands of sessions doesn't need a timer thread for each.
+        """
+        self._deadlines = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, session, deadline):
+        """
+        Calls session._check_idle() once `deadline` (a time.monotonic() value) has passed.
+        Sessions are held weakly, so a forgotten session can still be garbage collected.
+        """
+        with self._condition:
+            heapq.heappush(self._deadlines, (deadline, next(self._order), weakref.ref(session)))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="session-idle-watcher", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._deadlines or self._deadlines[0][0] > time.monotonic():
+                    self._condition.wait(self._deadlines[0][0] - time.monotonic() if self._deadlines else None)
+                _, _, reference = heapq.heappop(self._deadlines)
+            # Called without holding the condition: the check may schedule the session again
+            session = reference()
+            if session is not None:
+                session._check_idle()
+
+
+_idle_watcher = _IdleWatcher()
+
+
+# Example usage
+if __name__ == "__main__":
+    from kdf import key_check, new_kdf_params
+
+    kdf_params = new_kdf_params()
+    kdf_params["check"] = key_check(derive_key("correct horse battery staple", kdf_params))
+
+    session = UserSession()
+    start = time.perf_counter()
+    token = session.unlock("correct horse battery staple", kdf_params, idle_timeout=1)
+    print(f"Unlock with key derivation: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        session.open_vault(session.issue_token())
+    # 1000 vaults, so the total in seconds is the time per vault in milliseconds
+    print(f"Open a vault with a token: {time.perf_counter() - start:.3f} ms each")
+
+    time.sleep(1.5)
+    print("Locked after idle timeout:", not session.is_unlocked)
@@ -0,0 +1,320 @@
+import contextlib
+import threading
+import uuid
+from vault import Vault, _decrypt_item
+from vault_format import MappedVaultData, save_vault_file
+
+
+class ConcurrentVault(Vault):
+    def __init__(self, encryption_key, lock_stripes=64, **options):
+        """
+        Initializes a vault that many threads can read and write at once.
+
+        Writes to an item hold one of `lock_stripes` locks, picked by hashing the
+        item ID, so writers of different items rarely wait on each other. Reads
+        take no item lock at all: items are replaced, never changed in place, so
+        a reader always sees a whole item. Saving copies the item table under all
+        stripe locks, which only holds writers for the duration of the copy, and
+        then writes the copy without blocking anyone. Operations on the whole
+        vault (batches such as create_items, listing, index builds, key changes)
+        hold every stripe lock.
+
+        :param encryption_key: A key for encrypting/decrypting sensitive data.
+        :param lock_stripes: Number of item locks.
+        :param options: Any other Vault option (item_encryption, cache_size, storage, ...).
+        """
+        super().__init__(encryption_key, **options)
+        # Reentrant, so the writes inside a batch() can take their item's lock again
+        self._stripes = [threading.RLock() for _ in range(lock_stripes)]
+        # Odd while change_key runs, so a lock-free reader can tell that the key
+        # changed under it
+        self._key_generation = 0
+
+    def create_item(self, item_type, fields):
+        """
+        Creates a new item in the vault. Encryption runs before any lock is taken.
+
+        :param item_type: The type of the item (e.g., 'Login', 'Credit Card').
+        :param fields: A dictionary of fields (e.g., username, password, etc.).
+        :return: The ID of the created item.
+        :raises ValueError: If a field value is not a string.
+        """
+        item_id = str(uuid.uuid4())
+        item = self._encrypt_item(item_id, item_type, fields)
+        with self._lock_for(item_id):
+            self.data[item_id] = item
+            self.index.add(item_id, item)
+        print(f"Item created: {item_id}")
+        return item_id
+
+    def modify_item(self, item_id, fields):
+        """
+        Modifies an existing item in the vault.
+
+        :param item_id: The ID of the item to modify.
+        :param fields: A dictionary of fields to update.
+        :raises KeyError: If the item is not in the vault.
+        :raises ValueError: If a field value is not a string.
+        """
+        with self._lock_for(item_id):
+            super().modify_item(item_id, fields)
+
+    def delete_item(self, item_id):
+        """
+        Deletes an item from the vault.
+
+        :param item_id: The ID of the item to delete.
+        :raises KeyError: If the item is not in the vault.
+        """
+        with self._lock_for(item_id):
+            super().delete_item(item_id)
+
+    def retrieve_item(self, item_id):
+        """
+        Retrieves and decrypts an item from the vault without taking its lock.
+
+        :param item_id: The ID of the item to retrieve.
+        :return: The decrypted item or None if the item is not found.
+        """
+        item = self.cache.get(item_id)
+        if item is not None:
+            return item
+
+        generation = self._key_generation
+        encryption_manager = self.encryption_manager
+        stored_item = self.data.get(item_id)
+        if stored_item is None:
+            print(f"Item {item_id} not found.")
+            return None
+        try:
+            item = _decrypt_item(encryption_manager, item_id, stored_item)
+        except Exception:
+            if generation % 2 == 0 and generation == self._key_generation:
+                raise
+            item = None
+        with self._lock_for(item_id):
+            if item is None or generation != self._key_generation:
+                # The key changed while decrypting; change_key is done now that we hold the lock
+                stored_item = self.data.get(item_id)
+                if stored_item is None:
+                    print(f"Item {item_id} not found.")
+                    return None
+                item = _decrypt_item(self.encryption_manager, item_id, stored_item)
+                self.cache.put(item_id, item)
+            elif self.data.get(item_id) == stored_item:
+                # Only cache the result if nobody replaced the item while it was being decrypted
+                self.cache.put(item_id, item)
+        return item
+
+    def list_items(self):
+        """
+        Lists all items in the vault, read from storage while writers wait.
+
+        :return: A list of item IDs and types.
+        """
+        with self._all_locks():
+            return super().list_items()
+
+    def find(self, type=None, **fields):
+        """
+        Finds items by type and/or exact values of blind-indexed fields.
+
+        :param type: The item type to match, or None for any type.
+        :param fields: Indexed field names and the values to match.
+        :return: A list of matching item IDs.
+        """
+        self._build_index()
+        return self.index.find(type, fields)
+
+    def search(self, query, limit=10, min_score=0.5):
+        """
+        Fuzzy searches the searchable fields for partial text.
+
+        :param query: The (partial) text to look for.
+        :param limit: Maximum number of item IDs returned.
+        :param min_score: Minimum fraction of the query's trigrams an item must contain.
+        :return: A list of item IDs, best match first.
+        """
+        self._build_index()
+        return self.index.search(query, limit, min_score)
+
+    def reindex(self):
+        """
+        Recomputes the blind index and trigram tokens of every item, one item at
+        a time under its lock, then rebuilds the index while writers wait.
+        """
+        for item_id in self._item_ids():
+            with self._lock_for(item_id):
+                item = self.data.get(item_id)
+                if item is not None:
+                    fields = _decrypt_item(self.encryption_manager, item_id, item)["fields"]
+                    self.data[item_id] = self._reindexed(item, fields)
+        with self._all_locks():
+            self.index.build(self.data)
+
+    def change_key(self, encryption_key, header=None):
+        """
+        Re-encrypts every item under a new key while holding every stripe lock.
+        Readers that decrypted with the old key meanwhile read the item again.
+
+        :param encryption_key: The new key.
+        :param header: The new vault metadata. Defaults to the current header.
+        :return: The number of items re-encrypted.
+        """
+        with self._all_locks():
+            self._key_generation += 1
+            try:
+                return super().change_key(encryption_key, header)
+            finally:
+                self._key_generation += 1
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Groups the writes made inside the block, holding every stripe lock until
+        it ends, so no other thread's write lands in the batch's transaction.
+        """
+        with self._all_locks(), super().batch():
+            yield
+
+    def snapshot(self):
+        """
+        Copies the item table while holding every stripe lock. Only references
+        are copied, so this is quick, and the copy stays valid because items are
+        never changed in place.
+
+        :return: A dictionary of item ID -> stored item.
+        """
+        with self._all_locks():
+            return dict(self.data.items())
+
+    def save_to_file(self, file_path, format="json"):
+        """
+        Saves a snapshot of the vault to a file while other threads keep working.
+
+        :param file_path: The path of the file to save to.
+        :param format: 'json' or 'binary'.
+        """
+        save_vault_file(file_path, self.snapshot(), format, self.header)
+        print(f"Vault saved to {file_path}.")
+
+    def load_from_file(self, file_path):
+        """
+        Loads the vault data from a file. Binary files are read fully into memory,
+        since a lazily decoded mapping cannot be shared between threads.
+
+        :param file_path: The path of the file to load from.
+        """
+        with self._all_locks():
+            super().load_from_file(file_path)
+            if isinstance(self.data, MappedVaultData):
+                mapped = self.data
+                self.data = dict(mapped.items())
+                mapped.close()
+
+    def _migrate_item(self, item_id, item_encryption):
+        with self._lock_for(item_id):
+            return super()._migrate_item(item_id, item_encryption)
+
+    def _build_index(self):
+        # Built straight from storage, so listing types needs no decoding where
+        # the storage supports it; writers wait so none of their updates is lost
+        if self.index.ready:
+            return
+        with self._all_locks():
+            if not self.index.ready:
+                self.index.build(self.data)
+
+    def _item_ids(self):
+        with self._all_locks():
+            return list(self.data)
+
+    def _lock_for(self, item_id):
+        return self._stripes[hash(item_id) % len(self._stripes)]
+
+    def _all_locks(self):
+        return _LockSet(self._stripes)
+
+
+class _LockSet:
+    def __init__(self, locks):
+        self._locks = locks
+
+    def __enter__(self):
+        # Always acquired in the same order, so two callers cannot deadlock
+        for lock in self._locks:
+            lock.acquire()
+
+    def __exit__(self, *exc_info):
+        for lock in reversed(self._locks):
+            lock.release()
+
+
+# Example usage
+if __name__ == "__main__":
+    import io
+    import os
+    import sys
+    import tempfile
+    import time
+    from cryptography.fernet import Fernet
+    from vault import Vault
+
+    def writer(vault, rounds, item_ids, errors):
+        # Each writer owns one item, so it must always read back what it just wrote
+        try:
+            item_id = vault.create_item("Login", {"username": "user", "counter": "0"})
+            for counter in range(1, rounds + 1):
+                vault.modify_item(item_id, {"counter": str(counter)})
+                seen = vault.retrieve_item(item_id)["fields"]["counter"]
+                if seen != str(counter):
+                    errors.append(f"{item_id}: read counter {seen} right after writing {counter}")
+            item_ids.append(item_id)
+        except Exception as error:
+            errors.append(f"writer failed: {error!r}")
+
+    def check(vault, item_ids, snapshot_path, rounds):
+        errors = []
+        if sorted(item["id"] for item in vault.list_items()) != sorted(item_ids):
+            errors.append("list_items does not match the created items")
+        for item_id in item_ids:
+            counter = vault.retrieve_item(item_id)["fields"]["counter"]
+            if counter != str(rounds):
+                errors.append(f"{item_id}: final counter {counter}, expected {rounds}")
+        # The save ran while writers were busy: each saved item must still be whole
+        saved = Vault(vault.encryption_key)
+        saved.load_from_file(snapshot_path)
+        for item_id in saved.data:
+            counter = int(saved.retrieve_item(item_id)["fields"]["counter"])
+            if not 0 <= counter <= rounds:
+                errors.append(f"{item_id}: saved counter {counter} out of range")
+        return errors
+
+    rounds = 300
+    snapshot_path = os.path.join(tempfile.mkdtemp(), "concurrent_vault.json")
+    failures = []
+    for thread_count in (1, 2, 4, 8):
+        vault = ConcurrentVault(Fernet.generate_key(), item_encryption="item", cache_size=64)
+        item_ids, errors = [], []
+        threads = [threading.Thread(target=writer, args=(vault, rounds, item_ids, errors)) for _ in range(thread_count)]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            # Save while the writers are running
+            vault.save_to_file(snapshot_path)
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            errors += check(vault, item_ids, snapshot_path, rounds)
+
+        operations = thread_count * rounds * 2
+        print(f"{thread_count} threads: {operations / elapsed:,.0f} ops/s, "
+              f"{'consistent' if not errors else f'{len(errors)} errors'}")
+        failures += errors
+    # Encryption holds the GIL for most of each operation, so throughput stays
+    # about flat as threads are added; what this shows is that it does not drop
+    # and that no update is lost or torn
+    if failures:
+        print("\n".join(failures[:10]))
+        sys.exit(1)
@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from async_vault import AsyncVault
+from concurrent_vault import ConcurrentVault
+
+# Every message is a 4-byte big-endian length followed by a UTF-8 JSON body.
+# Requests:  {"id": 1, "op": "retrieve", "args": {"item_id": "..."}}
+# Responses: {"id": 1, "ok": true, "result": ...} or {"id": 1, "ok": false, "error": "..."}
+# A client may send many requests without waiting; responses carry the request
+# ID and can arrive in any order.
+_LENGTH = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+def _default_socket_path():
+    # In a directory only the current user can enter: in the shared temp
+    # directory another user could take the path first, or see it removed
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "mypass.sock")
+    return os.path.join(tempfile.gettempdir(), f"mypass-{os.getuid()}", "mypass.sock")
+
+
+DEFAULT_SOCKET_PATH = _default_socket_path()
+
+
+class VaultDaemon:
+    def __init__(self, vault, socket_path=DEFAULT_SOCKET_PATH, workers=8):
+        """
+        Initializes a daemon serving an unlocked vault over a Unix domain socket.
+
+        :param vault: The ConcurrentVault to serve.
+        :param socket_path: The path of the socket file. Only the current user can connect.
+        :param workers: Number of threads running vault calls.
+        """
+        self.vault = AsyncVault(vault, ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vault"))
+        self.socket_path = socket_path
+        self._operations = {
+            "create": self.vault.create_item,
+            "retrieve": self.vault.retrieve_item,
+            "list": self.vault.list_items,
+            "modify": self.vault.modify_item,
+            "delete": self.vault.delete_item,
+            "find": self.vault.find,
+            "search": self.vault.search,
+            "ping": self._ping,
+        }
+
+    async def serve(self):
+        """
+        Serves requests until SIGINT or SIGTERM is received.
+        """
+        _prepare_socket_path(self.socket_path)
+        # The socket file gets mode 0600 as it is created: changing it afterwards
+        # would leave a moment where other users could connect
+        previous_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        finally:
+            os.umask(previous_umask)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop.set)
+
+        print(f"Vault daemon listening on {self.socket_path}.")
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            os.remove(self.socket_path)
+            await self.vault.close()
+
+    async def _handle_connection(self, reader, writer):
+        pending = set()
+        try:
+            while True:
+                request = await _read_message(reader)
+                if request is None:
+                    break
+                # Handle each request in its own task so slow ones don't hold up the rest
+                task = asyncio.create_task(self._handle_request(request, writer))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        except (ConnectionError, ValueError) as error:
+            print(f"Closing connection: {error}")
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request, writer):
+        if not isinstance(request, dict):
+            response = {"id": None, "ok": False, "error": "A request must be a JSON object."}
+        else:
+            response = {"id": request.get("id")}
+            operation = self._operations.get(request.get("op"))
+            args = request.get("args", {})
+            if operation is None:
+                response.update(ok=False, error=f"Unknown operation: {request.get('op')}.")
+            elif not isinstance(args, dict):
+                response.update(ok=False, error="The arguments of a request must be a JSON object.")
+            else:
+                try:
+                    response.update(ok=True, result=await operation(**args))
+                except Exception as error:
+                    response.update(ok=False, error=f"{type(error).__name__}: {error}")
+        writer.write(_pack_message(response))
+        await writer.drain()
+
+    async def _ping(self):
+        return "pong"
+
+
+class VaultClient:
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH):
+        """
+        Connects to a running vault daemon.
+
+        :param socket_path: The path of the daemon's socket file.
+        """
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+        self._file = self._socket.makefile("rb")
+        self._next_id = 0
+
+    def call(self, op, **args):
+        """
+        Sends one request and waits for its result.
+
+        :param op: The operation ('create', 'retrieve', 'list', 'modify', 'delete', 'find', 'search').
+        :param args: The operation's arguments, e.g. item_id=... for 'retrieve'.
+        :return: The operation's result.
+        """
+        return self.pipeline([(op, args)])[0]
+
+    def pipeline(self, requests):
+        """
+        Sends several requests at once, then collects all results.
+
+        :param requests: A list of (op, args) pairs.
+        :return: The results, in request order.
+        """
+        ids = []
+        messages = []
+        for op, args in requests:
+            self._next_id += 1
+            ids.append(self._next_id)
+            messages.append(_pack_message({"id": self._next_id, "op": op, "args": args}))
+        self._socket.sendall(b"".join(messages))
+
+        responses = {}
+        while len(responses) < len(ids):
+            header = self._file.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                raise ConnectionError("Vault daemon closed the connection.")
+            response = json.loads(self._file.read(_LENGTH.unpack(header)[0]))
+            responses[response["id"]] = response
+
+        results = []
+        for request_id in ids:
+            response = responses[request_id]
+            if not response["ok"]:
+                raise RuntimeError(response["error"])
+            results.append(response["result"])
+        return results
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+        self._file.close()
+        self._socket.close()
+
+
+def _prepare_socket_path(socket_path):
+    """
+    Creates the socket's directory (readable by the current user only) if it is
+    missing, refuses the default directory if someone else owns it or can enter
+    it, and removes a socket file left behind by a previous run.
+
+    :param socket_path: The path of the socket file.
+    """
+    directory = os.path.dirname(socket_path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700)
+    if socket_path == DEFAULT_SOCKET_PATH:
+        status = os.stat(directory)
+        if status.st_uid != os.getuid() or status.st_mode & 0o077:
+            raise PermissionError(f"{directory} must belong to the current user and be closed to others.")
+    try:
+        status = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(status.st_mode):
+        raise FileExistsError(f"{socket_path} exists and is not a socket.")
+    os.remove(socket_path)
+
+
+def _pack_message(message):
+    body = json.dumps(message, separators=(",", ":")).encode()
+    return _LENGTH.pack(len(body)) + body
+
+
+async def _read_message(reader):
+    try:
+        header = await reader.readexactly(_LENGTH.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = _LENGTH.unpack(header)
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"message of {length} bytes is too large")
+    return json.loads(await reader.readexactly(length))
+
+
+# Example usage
+if __name__ == "__main__":
+    from main import VAULT_FILE, VAULT_FORMAT, load_vault_key
+    from storage import JournalStorage
+
+    parser = argparse.ArgumentParser(description="Serve the vault over a Unix domain socket.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="socket path")
+    parser.add_argument("--vault", default=VAULT_FILE, help="vault file (journaled, converted to the binary format)")
+    parser.add_argument("--workers", type=int, default=8, help="threads running vault calls")
+    args = parser.parse_args()
+
+    storage = JournalStorage(args.vault, format=VAULT_FORMAT)
+    vault = ConcurrentVault(load_vault_key(storage.header), item_encryption="item", cache_size=256, storage=storage)
+    asyncio.run(VaultDaemon(vault, args.socket, args.workers).serve())
+    print("Vault saved. Daemon stopped.")
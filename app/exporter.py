@@ -0,0 +1,171 @@
+import csv
+import json
+import os
+from itertools import islice
+from kdf import derive_key, new_kdf_params
+
+# Columns of a CSV export. Fields without a column of their own are kept as a
+# JSON object in 'extra_fields', so importing the file again loses nothing.
+CSV_COLUMNS = ("type", "name", "url", "username", "password", "totp", "notes")
+
+# A portable archive is a text file: one JSON header line, then one Fernet token
+# per line, each sealing {"seq": n, "items": [...]} under a key derived from a
+# passphrase (see kdf.py). The last token has "end": true and the item count, so a truncated
+# or reordered archive is detected when it is read back.
+ARCHIVE_FORMAT = "mypass-archive"
+ARCHIVE_VERSION = 1
+
+
+def write_ndjson(items, file):
+    """
+    Writes items as newline-delimited JSON, one {"id", "type", "fields"} object per line.
+
+    :param items: An iterable of (item_id, decrypted item) pairs.
+    :param file: An open text file.
+    :return: The number of items written.
+    """
+    count = 0
+    for item_id, item in items:
+        file.write(json.dumps({"id": item_id, **item}) + "\n")
+        count += 1
+    return count
+
+
+def write_csv(items, file):
+    """
+    Writes items as CSV with the CSV_COLUMNS layout plus 'extra_fields'.
+
+    :param items: An iterable of (item_id, decrypted item) pairs.
+    :param file: An open text file (opened with newline='').
+    :return: The number of items written.
+    """
+    writer = csv.writer(file)
+    writer.writerow(CSV_COLUMNS + ("extra_fields",))
+    count = 0
+    for _, item in items:
+        fields = dict(item["fields"])
+        row = [item["type"]] + [fields.pop(column, "") for column in CSV_COLUMNS[1:]]
+        writer.writerow(row + [json.dumps(fields) if fields else ""])
+        count += 1
+    return count
+
+
+def write_archive(items, file, passphrase, chunk_size=500):
+    """
+    Writes items as a portable archive, re-encrypted under a passphrase instead
+    of the vault key. Items are sealed `chunk_size` at a time.
+
+    :param items: An iterable of (item_id, decrypted item) pairs.
+    :param file: An open text file.
+    :param passphrase: The passphrase protecting the archive.
+    :param chunk_size: Number of items per sealed record.
+    :return: The number of items written.
+    """
+    kdf_params = new_kdf_params("scrypt")
+    fernet = archive_fernet(passphrase, kdf_params)
+    file.write(json.dumps({"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION, "kdf": kdf_params}) + "\n")
+
+    iterator = iter(items)
+    count = 0
+    seq = 0
+    while chunk := list(islice(iterator, chunk_size)):
+        records = [{"id": item_id, **item} for item_id, item in chunk]
+        file.write(_seal_record(fernet, {"seq": seq, "items": records}))
+        count += len(chunk)
+        seq += 1
+    file.write(_seal_record(fernet, {"seq": seq, "items": [], "end": True, "count": count}))
+    return count
+
+
+def archive_fernet(passphrase, kdf_params):
+    """
+    Derives the Fernet instance sealing an archive.
+
+    :param passphrase: The archive passphrase.
+    :param kdf_params: The key derivation parameters from the archive header.
+    :return: A Fernet instance.
+    """
+    if not passphrase:
+        raise ValueError("An archive needs a passphrase.")
+    from cryptography.fernet import Fernet
+    return Fernet(derive_key(passphrase, kdf_params))
+
+
+def export_items(vault, file, format="ndjson", workers=None, chunk_size=500, passphrase=None):
+    """
+    Streams every item of a vault into an open file. Items are read from
+    storage and decrypted one chunk at a time, so only a few chunks of
+    plaintext are in memory however large the vault is.
+
+    :param vault: The Vault to export.
+    :param file: An open text file (opened with newline='').
+    :param format: 'ndjson', 'csv' or 'archive'.
+    :param workers: Number of decryption worker processes. None or 1 decrypts in this process.
+    :param chunk_size: Number of items decrypted (and, for archives, sealed) at a time.
+    :param passphrase: The archive passphrase, for the 'archive' format.
+    :return: The number of items exported.
+    """
+    # Only the IDs are listed up front; items are fetched from storage as they are decrypted
+    items = vault.iter_decrypted_items(list(vault.data), workers, chunk_size)
+    if format == "ndjson":
+        return write_ndjson(items, file)
+    if format == "csv":
+        return write_csv(items, file)
+    if format == "archive":
+        return write_archive(items, file, passphrase, chunk_size)
+    raise ValueError(f"Unknown export format: {format}.")
+
+
+def export_file(vault, file_path, format=None, workers=None, chunk_size=500, passphrase=None):
+    """
+    Streams every item of a vault into a new file that only the current user can read.
+
+    :param vault: The Vault to export.
+    :param file_path: The path of the file to write.
+    :param format: 'ndjson', 'csv' or 'archive'. Detected from the file extension if None.
+    :param workers: Number of decryption worker processes.
+    :param chunk_size: Number of items decrypted at a time.
+    :param passphrase: The archive passphrase, for the 'archive' format.
+    :return: The number of items exported.
+    """
+    format = format or export_format_for(file_path)
+    descriptor = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(descriptor, "w", encoding="utf-8", newline="") as file:
+        return export_items(vault, file, format, workers, chunk_size, passphrase)
+
+
+def export_format_for(file_path):
+    """
+    Picks an export format from a file extension: .csv, .mpa (archive) or NDJSON otherwise.
+
+    :param file_path: The path of the file.
+    :return: 'csv', 'archive' or 'ndjson'.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    return {".csv": "csv", ".mpa": "archive"}.get(extension, "ndjson")
+
+
+def _seal_record(fernet, record):
+    return fernet.encrypt(json.dumps(record, separators=(",", ":")).encode()).decode() + "\n"
+
+
+# Example usage
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+    from cryptography.fernet import Fernet
+    from vault import Vault
+
+    vault = Vault(Fernet.generate_key(), item_encryption="item")
+    vault.create_items(("Login", {"name": f"site{n}", "url": f"https://site{n}.example.com",
+                                  "username": f"user{n}", "password": f"password{n}"}) for n in range(100000))
+
+    for format in ("ndjson", "csv", "archive"):
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(os.devnull, "w", newline="") as file:
+            count = export_items(vault, file, format, passphrase="correct horse battery staple")
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{format}: {count} items in {elapsed:.2f} s, peak extra memory {peak / 2 ** 20:.1f} MiB")
@@ -0,0 +1,211 @@
+import csv
+import json
+from itertools import islice
+from exporter import ARCHIVE_FORMAT, ARCHIVE_VERSION, CSV_COLUMNS, archive_fernet, export_format_for
+
+# Column layouts of common password manager CSV exports, recognized by their header
+CSV_LAYOUTS = {
+    "chrome": ("name", "url", "username", "password"),
+    "firefox": ("url", "username", "password", "httpRealm", "formActionOrigin", "guid"),
+    "bitwarden": ("folder", "favorite", "type", "name", "notes", "fields", "login_uri", "login_username", "login_password"),
+    "lastpass": ("url", "username", "password", "extra", "name", "grouping"),
+    # Our own CSV export; read like a generic file
+    "mypass": CSV_COLUMNS + ("extra_fields",),
+}
+
+_BITWARDEN_TYPES = {"login": "Login", "note": "Secure Note", "card": "Credit Card", "identity": "Identity"}
+
+
+def detect_csv_layout(header):
+    """
+    Picks the export layout whose columns all appear in a CSV header.
+
+    :param header: The list of column names.
+    :return: A key of CSV_LAYOUTS, or 'generic'.
+    """
+    columns = set(header)
+    # Check the most specific layouts first
+    for layout in sorted(CSV_LAYOUTS, key=lambda name: -len(CSV_LAYOUTS[name])):
+        if columns.issuperset(CSV_LAYOUTS[layout]):
+            return layout
+    return "generic"
+
+
+def read_csv(file, layout=None):
+    """
+    Yields (item_type, fields) pairs from a CSV export, one row at a time.
+
+    Generic CSV files may have a 'type' column (defaults to 'Login'); every
+    other non-empty column becomes a field, and an 'extra_fields' column holds
+    a JSON object of further fields, as written by the CSV export.
+
+    :param file: An open text file.
+    :param layout: A key of CSV_LAYOUTS or 'generic'. Detected from the header if None.
+    """
+    reader = csv.DictReader(file)
+    layout = layout or detect_csv_layout(reader.fieldnames or [])
+    for row in reader:
+        yield _convert_row(layout, row)
+
+
+def read_ndjson(file):
+    """
+    Yields (item_type, fields) pairs from newline-delimited JSON, one
+    {"type": ..., "fields": {...}} object per line.
+
+    :param file: An open text file.
+    """
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            yield record["type"], {name: str(value) for name, value in record["fields"].items()}
+        except (json.JSONDecodeError, KeyError, AttributeError):
+            raise ValueError(f"Invalid item on line {line_number}.")
+
+
+def read_archive(file, passphrase):
+    """
+    Yields (item_type, fields) pairs from a portable archive written by the exporter.
+
+    :param file: An open text file.
+    :param passphrase: The archive passphrase.
+    """
+    try:
+        header = json.loads(file.readline())
+    except json.JSONDecodeError:
+        raise ValueError("Not a MyPass archive.")
+    if not isinstance(header, dict) or header.get("format") != ARCHIVE_FORMAT or header.get("version") != ARCHIVE_VERSION:
+        raise ValueError("Not a MyPass archive, or an unsupported version.")
+    fernet = archive_fernet(passphrase, header["kdf"])
+    from cryptography.fernet import InvalidToken
+
+    seq = 0
+    count = 0
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(fernet.decrypt(line.strip().encode()))
+        except InvalidToken:
+            raise ValueError("Wrong passphrase or damaged archive.")
+        if record["seq"] != seq:
+            raise ValueError("Archive records are out of order.")
+        if record.get("end"):
+            if record.get("count") != count:
+                raise ValueError("Archive item count does not match its contents.")
+            return
+        for item in record["items"]:
+            yield item["type"], item["fields"]
+        count += len(record["items"])
+        seq += 1
+    raise ValueError("Archive is truncated.")
+
+
+def read_items(file, format, passphrase=None):
+    """
+    Yields (item_type, fields) pairs from an open file.
+
+    :param file: An open text file.
+    :param format: 'csv', 'ndjson' or 'archive'.
+    :param passphrase: The archive passphrase, for the 'archive' format.
+    """
+    if format == "csv":
+        return read_csv(file)
+    if format == "ndjson":
+        return read_ndjson(file)
+    if format == "archive":
+        return read_archive(file, passphrase)
+    raise ValueError(f"Unknown import format: {format}.")
+
+
+def import_items(vault, items, chunk_size=1000, progress=None):
+    """
+    Adds items to a vault in chunks. Each chunk is encrypted in one batch and
+    committed to storage in one write, so memory stays bounded by the chunk
+    size however long the input is.
+
+    :param vault: The Vault to add items to.
+    :param items: An iterable of (item_type, fields) pairs, typically a generator.
+    :param chunk_size: Number of items per chunk.
+    :param progress: Optional callable receiving the number of items imported so far.
+    :return: The number of items imported.
+    """
+    iterator = iter(items)
+    count = 0
+    while chunk := list(islice(iterator, chunk_size)):
+        vault.create_items(chunk)
+        count += len(chunk)
+        if progress:
+            progress(count)
+    return count
+
+
+def import_file(vault, file_path, format=None, chunk_size=1000, progress=None, passphrase=None):
+    """
+    Streams a CSV, NDJSON or archive file into a vault.
+
+    :param vault: The Vault to add items to.
+    :param file_path: The path of the file to import.
+    :param format: 'csv', 'ndjson' or 'archive'. Detected from the file extension if None.
+    :param chunk_size: Number of items per chunk.
+    :param progress: Optional callable receiving the number of items imported so far.
+    :param passphrase: The archive passphrase, for the 'archive' format.
+    :return: The number of items imported.
+    """
+    format = format or export_format_for(file_path)
+    # utf-8-sig drops the byte order mark some exporters write
+    with open(file_path, "r", encoding="utf-8-sig", newline="") as file:
+        return import_items(vault, read_items(file, format, passphrase), chunk_size, progress)
+
+
+def _convert_row(layout, row):
+    if layout == "chrome":
+        return "Login", _non_empty(name=row["name"], url=row["url"], username=row["username"],
+                                   password=row["password"], notes=row.get("note"))
+    if layout == "firefox":
+        return "Login", _non_empty(url=row["url"], username=row["username"], password=row["password"])
+    if layout == "bitwarden":
+        item_type = _BITWARDEN_TYPES.get(row["type"], row["type"].title() or "Login")
+        return item_type, _non_empty(name=row["name"], url=row["login_uri"], username=row["login_username"],
+                                     password=row["login_password"], totp=row.get("login_totp"), notes=row["notes"])
+    if layout == "lastpass":
+        # LastPass exports secure notes with the placeholder URL 'http://sn'
+        item_type = "Secure Note" if row["url"] == "http://sn" else "Login"
+        return item_type, _non_empty(name=row["name"], url=row["url"] if item_type == "Login" else None,
+                                     username=row["username"], password=row["password"], totp=row.get("totp"),
+                                     notes=row["extra"], folder=row["grouping"])
+    # Skip the overflow entries csv.DictReader makes for ragged rows
+    fields = {name: value for name, value in row.items() if name and isinstance(value, str)}
+    item_type = fields.pop("type", None) or "Login"
+    extra_fields = fields.pop("extra_fields", None)
+    if extra_fields:
+        fields.update(json.loads(extra_fields))
+    return item_type, _non_empty(**fields)
+
+
+def _non_empty(**fields):
+    return {name: value for name, value in fields.items() if value}
+
+
+# Example usage
+if __name__ == "__main__":
+    import io
+    import time
+    from cryptography.fernet import Fernet
+    from vault import Vault
+
+    # A Chrome-style export of 100k logins, generated on the fly
+    export = io.StringIO()
+    writer = csv.writer(export)
+    writer.writerow(["name", "url", "username", "password"])
+    for n in range(100000):
+        writer.writerow([f"site{n}", f"https://site{n}.example.com", f"user{n}", f"password{n}"])
+    export.seek(0)
+
+    vault = Vault(Fernet.generate_key(), item_encryption="item")
+    start = time.perf_counter()
+    count = import_items(vault, read_csv(export), chunk_size=5000)
+    elapsed = time.perf_counter() - start
+    print(f"Imported {count} items in {elapsed:.2f} s ({count / elapsed:,.0f} items/s)")
@@ -1,12 +1,29 @@
 from vault import Vault
-from clipboard import ClipboardManager
+from storage import JournalStorage
 from encryptions import EncryptionManager
-from password_strength import PasswordStrengthChecker
+from kdf import calibrate, derive_key, key_check, verify_key
+from importer import import_file, import_items, read_items
+from exporter import export_file, export_format_for, export_items
+import argparse
+import contextlib
+import functools
+import getpass
+import json
 import os
+import sys
 
 # Constants for file storage
 VAULT_FILE = "vault_data.json"
+# Format the vault file is written in. A binary vault is memory-mapped, so opening
+# it reads only the item index instead of parsing every item; a JSON vault from an
+# older version is converted the first time it is opened. The format is detected
+# from the file's content, so the file keeps its name.
+VAULT_FORMAT = "binary"
 ENCRYPTION_KEY_FILE = "encryption_key.txt"
+# Read instead of prompting, for scripts
+MASTER_PASSWORD_VARIABLE = "MYPASS_MASTER_PASSWORD"
+# Default wordlist (text or compiled index) for the passphrase command
+WORDLIST_VARIABLE = "MYPASS_WORDLIST"
 
 # Helper function to load or generate encryption key
 def load_or_generate_key():
@@ -19,17 +36,254 @@ def load_or_generate_key():
             key_file.write(key.decode())
         return key
 
-def main():
-    # Initialize components
-    encryption_key = load_or_generate_key()
-    encryption_manager = EncryptionManager(encryption_key)
-    vault = Vault(encryption_key)
-    clipboard_manager = ClipboardManager(clear_timeout=10)
-    password_checker = PasswordStrengthChecker()
+# Helper function to get the vault key: derived from the master password once the
+# vault header holds key derivation parameters, otherwise the key file is used
+def load_vault_key(header):
+    kdf_params = header.get("kdf")
+    if kdf_params is None:
+        return load_or_generate_key()
+    key = derive_key(read_master_password(), kdf_params)
+    if not verify_key(key, kdf_params):
+        raise ValueError("Wrong master password.")
+    return key
+
+def read_master_password(prompt="Master password: "):
+    return os.environ.get(MASTER_PASSWORD_VARIABLE) or getpass.getpass(prompt)
+
+# Helper function to switch the vault to a master password derived with `kdf_params`
+def set_master_password(vault, kdf_params):
+    password = read_master_password("New master password: ")
+    if MASTER_PASSWORD_VARIABLE not in os.environ and getpass.getpass("Repeat the new master password: ") != password:
+        raise ValueError("The passwords do not match.")
+    key = derive_key(password, kdf_params)
+    vault.change_key(key, {**vault.header, "kdf": {**kdf_params, "check": key_check(key)}})
+    # The old key can no longer open the vault
+    if os.path.exists(ENCRYPTION_KEY_FILE):
+        os.remove(ENCRYPTION_KEY_FILE)
+    print("Master password set.")
+
+# Helper function to open the vault; every change is journaled from here on
+def open_vault(format=VAULT_FORMAT):
+    storage = JournalStorage(VAULT_FILE, format=format)
+    try:
+        encryption_key = load_vault_key(storage.header)
+    except ValueError:
+        storage.close()
+        raise
+    vault = Vault(encryption_key, item_encryption="item", cache_size=32, cache_ttl=120, storage=storage)
+    print(f"Vault loaded from {VAULT_FILE}.")
+    return vault
+
+# The clipboard and password tools are only built when a menu option needs them
+@functools.cache
+def get_clipboard_manager():
+    from clipboard import ClipboardManager
+    return ClipboardManager(clear_timeout=10)
+
+@functools.cache
+def get_password_checker():
+    from password_strength import PasswordStrengthChecker
+    return PasswordStrengthChecker()
+
+def parse_fields(pairs):
+    fields = {}
+    for pair in pairs:
+        key, separator, value = pair.partition("=")
+        if not separator:
+            raise ValueError(f"Invalid field '{pair}'. Use key=value.")
+        fields[key.strip()] = value.strip()
+    return fields
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="MyPass Password Manager. Run without a command for the interactive menu.")
+    parser.add_argument("--vault-format", choices=("binary", "json"), default=VAULT_FORMAT,
+                        help=f"format of {VAULT_FILE}; an existing vault is converted to it (default {VAULT_FORMAT})")
+    commands = parser.add_subparsers(dest="command")
+
+    add = commands.add_parser("add", help="add an item")
+    add.add_argument("type", help="item type, e.g. Login")
+    add.add_argument("fields", nargs="*", help="fields as key=value")
+
+    get = commands.add_parser("get", help="show an item as JSON")
+    get.add_argument("id", help="item ID")
+
+    list_command = commands.add_parser("list", help="list item IDs and types")
+    list_command.add_argument("--type", help="only list items of this type")
+
+    delete = commands.add_parser("delete", help="delete an item")
+    delete.add_argument("id", help="item ID")
+
+    import_command = commands.add_parser("import", help="add items from a CSV or newline-delimited JSON file")
+    import_command.add_argument("file", help="CSV export (Chrome, Firefox, Bitwarden, LastPass or generic), "
+                                             ".mpa archive, or NDJSON with one {\"type\": ..., \"fields\": {...}} per line; - reads stdin")
+    import_command.add_argument("--format", choices=("csv", "ndjson", "archive"), help="defaults to the file extension")
+
+    export = commands.add_parser("export", help="write all items as NDJSON, CSV or a passphrase-protected archive")
+    export.add_argument("file", help="output file (.csv, .mpa for an archive, NDJSON otherwise), or - for stdout")
+    export.add_argument("--format", choices=("ndjson", "csv", "archive"), help="defaults to the file extension")
+    export.add_argument("--workers", type=int, help="decrypt in this many processes")
+
+    commands.add_parser("batch", help="run newline-delimited JSON commands from stdin in one load/save cycle")
+
+    calibrate_command = commands.add_parser("calibrate", help="pick key derivation costs for this machine")
+    calibrate_command.add_argument("--target-ms", type=float, default=500, help="unlock time to aim for")
+    calibrate_command.add_argument("--algorithm", choices=("scrypt", "pbkdf2-sha256"), default="scrypt")
+    calibrate_command.add_argument("--apply", action="store_true",
+                                   help="set a new master password derived with the chosen costs")
+
+    passphrase = commands.add_parser("passphrase", help="generate diceware-style passphrases from a wordlist")
+    passphrase.add_argument("--wordlist", default=os.environ.get(WORDLIST_VARIABLE),
+                            help=f"text wordlist or compiled index; defaults to ${WORDLIST_VARIABLE}")
+    passphrase.add_argument("--words", type=int, default=6, help="words per passphrase")
+    passphrase.add_argument("--separator", action="append",
+                            help="string between words (default -); repeat to pick one at random per gap")
+    passphrase.add_argument("--capitalization", choices=("lower", "capitalize", "upper", "random"), default="lower")
+    passphrase.add_argument("--count", type=int, default=1, help="number of passphrases")
+    passphrase.add_argument("--save-index", metavar="FILE", help="also compile the wordlist into FILE for fast loading")
+    return parser
+
+def run_command(vault, args, out):
+    if args.command == "add":
+        print(json.dumps({"id": vault.create_item(args.type, parse_fields(args.fields))}), file=out)
+
+    elif args.command == "get":
+        item = vault.retrieve_item(args.id)
+        if item is None:
+            return 1
+        print(json.dumps(item), file=out)
+
+    elif args.command == "list":
+        for item in vault.list_items():
+            if args.type is None or item["type"] == args.type:
+                print(json.dumps(item), file=out)
 
-    # Load existing vault data if available
-    if os.path.exists(VAULT_FILE):
-        vault.load_from_file(VAULT_FILE)
+    elif args.command == "delete":
+        try:
+            vault.delete_item(args.id)
+        except KeyError:
+            print(f"Item {args.id} not found.")
+            return 1
+
+    elif args.command == "import":
+        format = args.format or ("ndjson" if args.file == "-" else export_format_for(args.file))
+        passphrase = getpass.getpass("Archive passphrase: ") if format == "archive" else None
+        if args.file == "-":
+            count = import_items(vault, read_items(sys.stdin, format, passphrase))
+        else:
+            count = import_file(vault, args.file, format, progress=lambda count: print(f"Imported {count} items..."),
+                                passphrase=passphrase)
+        print(f"Imported {count} items.")
+
+    elif args.command == "export":
+        format = args.format or ("ndjson" if args.file == "-" else export_format_for(args.file))
+        passphrase = getpass.getpass("Archive passphrase: ") if format == "archive" else None
+        if args.file == "-":
+            count = export_items(vault, out, format, args.workers, passphrase=passphrase)
+        else:
+            count = export_file(vault, args.file, format, args.workers, passphrase=passphrase)
+        print(f"Exported {count} items.")
+
+    elif args.command == "calibrate":
+        kdf_params, elapsed = calibrate(args.target_ms / 1000, args.algorithm)
+        cost = {name: value for name, value in kdf_params.items() if name != "salt"}
+        print(json.dumps({**cost, "unlock_ms": round(elapsed * 1000)}), file=out)
+        if args.apply:
+            set_master_password(vault, kdf_params)
+
+    elif args.command == "passphrase":
+        from passphrase import PassphraseGenerator, PassphrasePolicy
+        if args.wordlist is None:
+            raise ValueError(f"No wordlist given. Use --wordlist or set {WORDLIST_VARIABLE}.")
+        generator = PassphraseGenerator(args.wordlist)
+        if args.save_index:
+            generator.wordlist.save_index(args.save_index)
+        policy = PassphrasePolicy(args.words, args.separator or "-", args.capitalization)
+        print(f"{generator.entropy(policy):.1f} bits of entropy per passphrase.")
+        for passphrase in generator.generate_many(args.count, policy):
+            print(passphrase, file=out)
+
+    elif args.command == "batch":
+        failures = 0
+        with vault.batch():
+            for line in sys.stdin:
+                if line.strip():
+                    try:
+                        result = run_batch_command(vault, json.loads(line))
+                    except json.JSONDecodeError as error:
+                        result = {"ok": False, "error": f"Invalid JSON: {error}."}
+                    except Exception as error:
+                        # Like the daemon: a command that fails doesn't stop the rest of the batch
+                        result = {"ok": False, "error": f"{type(error).__name__}: {error}"}
+                    failures += not result["ok"]
+                    print(json.dumps(result), file=out)
+        return 1 if failures else 0
+    return 0
+
+def run_batch_command(vault, command):
+    # One batch line: {"op": "add" | "get" | "modify" | "delete" | "list", ...}.
+    # A bad line gets an error result; the rest of the batch still runs.
+    if not isinstance(command, dict):
+        return {"ok": False, "error": "A command must be a JSON object."}
+    op = command.get("op")
+    item_id = command.get("id")
+    fields = command.get("fields", {})
+    if not isinstance(fields, dict):
+        return {"ok": False, "error": "'fields' must be a JSON object."}
+    if not all(isinstance(value, str) for value in fields.values()):
+        return {"ok": False, "error": "Field values must be strings."}
+    if op == "add":
+        if not isinstance(command.get("type"), str):
+            return {"ok": False, "error": "'add' needs a 'type'."}
+        return {"ok": True, "id": vault.create_item(command["type"], fields)}
+    if op == "list":
+        return {"ok": True, "items": vault.list_items()}
+    if op not in ("get", "modify", "delete"):
+        return {"ok": False, "error": f"Unknown op: {op}."}
+    if not isinstance(item_id, str):
+        return {"ok": False, "error": f"'{op}' needs an 'id'."}
+    try:
+        if op == "get":
+            item = vault.retrieve_item(item_id)
+            if item is None:
+                raise KeyError(item_id)
+            return {"ok": True, "item": item}
+        if op == "modify":
+            vault.modify_item(item_id, fields)
+        else:
+            vault.delete_item(item_id)
+    except KeyError:
+        return {"ok": False, "error": f"Item {item_id} not found."}
+    return {"ok": True}
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        run_interactive(args.vault_format)
+        return 0
+
+    # Keep stdout for results; the vault's status messages go to stderr
+    out = sys.stdout
+    vault = None
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            # Calibrating alone and generating passphrases don't need the vault
+            needs_vault = args.command != "passphrase" and not (args.command == "calibrate" and not args.apply)
+            vault = open_vault(args.vault_format) if needs_vault else None
+            return run_command(vault, args, out)
+        except (ValueError, KeyError) as error:
+            print(f"Error: {error}")
+            return 1
+        finally:
+            if vault is not None:
+                vault.close()
+
+def run_interactive(vault_format=VAULT_FORMAT):
+    # Initialize components
+    try:
+        vault = open_vault(vault_format)
+    except ValueError as error:
+        print(f"Error: {error}")
+        return
 
     # Command-line interface
     while True:
@@ -74,12 +328,18 @@ def main():
                     fields[key.strip()] = value.strip()
                 except ValueError:
                     print("Invalid format. Use key=value.")
-            vault.modify_item(item_id, fields)
+            try:
+                vault.modify_item(item_id, fields)
+            except KeyError:
+                print(f"Item {item_id} not found.")
 
         elif choice == "3":
             # Delete an item
             item_id = input("Enter the ID of the item to delete: ").strip()
-            vault.delete_item(item_id)
+            try:
+                vault.delete_item(item_id)
+            except KeyError:
+                print(f"Item {item_id} not found.")
 
         elif choice == "4":
             # View an item
@@ -93,7 +353,7 @@ def main():
                 if input("Copy any field to clipboard? (y/n): ").lower() == "y":
                     field_to_copy = input("Enter field name: ").strip()
                     if field_to_copy in item["fields"]:
-                        clipboard_manager.copy_to_clipboard(item["fields"][field_to_copy])
+                        get_clipboard_manager().copy_to_clipboard(item["fields"][field_to_copy])
                     else:
                         print(f"Field '{field_to_copy}' not found.")
             else:
@@ -103,10 +363,10 @@ def main():
             # Generate a strong password
             try:
                 length = int(input("Enter desired password length (minimum 8): ").strip())
-                password = password_checker.suggest_password(length)
+                password = get_password_checker().suggest_password(length)
                 print("Generated password:", password)
                 if input("Copy to clipboard? (y/n): ").lower() == "y":
-                    clipboard_manager.copy_to_clipboard(password)
+                    get_clipboard_manager().copy_to_clipboard(password)
             except ValueError:
                 print("Invalid input. Please enter a valid number.")
 
@@ -121,8 +381,8 @@ def main():
                 print("No items in the vault.")
 
         elif choice == "7":
-            # Save and exit
-            vault.save_to_file(VAULT_FILE)
+            # Close the journal and exit
+            vault.close()
             print("Vault saved. Goodbye!")
             break
 
@@ -130,4 +390,4 @@ def main():
             print("Invalid option. Please try again.")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
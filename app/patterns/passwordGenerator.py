@@ -1,6 +1,6 @@
 # builder.py
-import random
 import string
+from password_generator import PasswordGenerator, PasswordPolicy
 
 class PasswordBuilder:
     def __init__(self):
@@ -8,6 +8,7 @@ class PasswordBuilder:
         self._include_upper = True
         self._include_numbers = True
         self._include_symbols = True
+        self._generator = PasswordGenerator()
 
     def set_length(self, length):
         self._length = length
@@ -26,15 +27,15 @@ class PasswordBuilder:
         return self
 
     def build(self):
-        characters = string.ascii_lowercase
-        if self._include_upper:
-            characters += string.ascii_uppercase
-        if self._include_numbers:
-            characters += string.digits
-        if self._include_symbols:
-            characters += string.punctuation
-
-        return ''.join(random.choice(characters) for _ in range(self._length))
+        return self._generator.generate(self._policy())
+
+    def build_many(self, count):
+        return self._generator.generate_many(count, self._policy())
+
+    def _policy(self):
+        # Like the original builder: characters are drawn from the alphabet, no class is forced in
+        return PasswordPolicy(self._length, uppercase=self._include_upper, digits=self._include_numbers,
+                              symbols=self._include_symbols, symbol_set=string.punctuation, require=())
 
 # Usage
 builder = PasswordBuilder()
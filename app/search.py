@@ -0,0 +1,272 @@
+import functools
+import hashlib
+import hmac
+import re
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+
+# Fields whose values are normalized to a host name before blind indexing
+URL_FIELDS = ("url", "uri", "website", "login_uri")
+
+# Length in hex characters of a stored trigram token
+GRAM_TOKEN_SIZE = 12
+# Number of trigram -> token results kept in memory. The trigrams are plaintext
+# fragments, so the cache is bounded and dropped along with the indexes.
+GRAM_TOKEN_CACHE_SIZE = 4096
+
+
+class VaultIndex:
+    def __init__(self, encryption_manager, indexed_fields=(), searchable_fields=()):
+        """
+        Initializes the secondary indexes of a vault.
+
+        Items are indexed by type and, for the opt-in `indexed_fields`, by a blind
+        index token: a keyed HMAC of the normalized field value. The opt-in
+        `searchable_fields` are also split into trigrams, each stored as a keyed
+        HMAC token, for fuzzy search. Tokens are stored with each item, so the
+        index can be rebuilt and queried without decrypting anything. The index
+        can be shared between threads.
+
+        :param encryption_manager: The EncryptionManager the index keys are derived from.
+        :param indexed_fields: Names of the fields to blind index (e.g. 'url', 'username').
+        :param searchable_fields: Names of the fields to fuzzy search (e.g. 'name', 'url').
+        """
+        self.indexed_fields = tuple(indexed_fields)
+        self.searchable_fields = tuple(searchable_fields)
+        self._blind_key = encryption_manager.derive_subkey(b"MyPass blind index") if self.indexed_fields else None
+        self._gram_key = encryption_manager.derive_subkey(b"MyPass trigram index") if self.searchable_fields else None
+        self._gram_token = functools.lru_cache(maxsize=GRAM_TOKEN_CACHE_SIZE)(self._hash_gram)
+        self._by_type = {}
+        self._by_token = {}
+        self._by_gram = {}
+        self._entries = {}
+        self._lock = threading.RLock()
+        self.ready = False
+
+    def tokens_for(self, fields):
+        """
+        Computes the blind index tokens of the indexed fields present in `fields`.
+
+        :param fields: A dictionary of plaintext fields.
+        :return: A dictionary of field name -> token.
+        """
+        return {name: self._token(name, value) for name, value in fields.items() if name in self.indexed_fields}
+
+    def grams_for(self, fields):
+        """
+        Computes the trigram tokens of the searchable fields present in `fields`.
+
+        :param fields: A dictionary of plaintext fields (all fields of the item).
+        :return: The tokens concatenated into one string, as stored with the item.
+        """
+        grams = set()
+        for name, value in fields.items():
+            if name in self.searchable_fields:
+                grams |= trigrams(value)
+        return "".join(sorted(self._gram_token(gram) for gram in grams))
+
+    def build(self, items):
+        """
+        (Re)builds the indexes from the stored form of all items.
+
+        :param items: A mapping of item IDs to stored items.
+        """
+        with self._lock:
+            self.reset()
+            if not (self.indexed_fields or self.searchable_fields) and hasattr(items, "item_types"):
+                # Only types are needed, which some storage can list without decoding items
+                for item_id, item_type in items.item_types():
+                    self._insert(item_id, item_type, (), "")
+            else:
+                for item_id, item in items.items():
+                    self._insert(item_id, item["type"], item.get("blind", {}).values(), item.get("grams", ""))
+            self.ready = True
+
+    def reset(self):
+        """
+        Drops the indexes, and the cached trigram tokens; the indexes are rebuilt
+        on the next query.
+        """
+        with self._lock:
+            self._gram_token.cache_clear()
+            self._by_type.clear()
+            self._by_token.clear()
+            self._by_gram.clear()
+            self._entries.clear()
+            self.ready = False
+
+    def add(self, item_id, item):
+        """
+        Indexes a stored item, replacing any previous entry for the same ID.
+
+        :param item_id: The ID of the item.
+        :param item: The stored form of the item.
+        """
+        with self._lock:
+            if not self.ready:
+                return
+            self.remove(item_id)
+            self._insert(item_id, item["type"], item.get("blind", {}).values(), item.get("grams", ""))
+
+    def remove(self, item_id):
+        """
+        Removes an item from the indexes.
+
+        :param item_id: The ID of the item.
+        """
+        with self._lock:
+            entry = self._entries.pop(item_id, None)
+            if entry is None:
+                return
+            item_type, tokens, grams = entry
+            _discard(self._by_type, item_type, item_id)
+            for token in tokens:
+                _discard(self._by_token, token, item_id)
+            for gram in grams:
+                _discard(self._by_gram, gram, item_id)
+
+    def find(self, item_type=None, fields=None):
+        """
+        Finds the items matching a type and/or exact (normalized) field values.
+
+        :param item_type: The item type to match, or None for any type.
+        :param fields: A dictionary of indexed field names to values.
+        :return: A list of matching item IDs.
+        """
+        with self._lock:
+            candidate_sets = []
+            if item_type is not None:
+                candidate_sets.append(self._by_type.get(item_type, set()))
+            for name, value in (fields or {}).items():
+                if name not in self.indexed_fields:
+                    raise ValueError(f"Field '{name}' is not indexed.")
+                candidate_sets.append(self._by_token.get(self._token(name, value), set()))
+
+            if not candidate_sets:
+                return list(self._entries)
+            # Intersect starting from the smallest set
+            candidate_sets.sort(key=len)
+            matches = set(candidate_sets[0])
+            for candidates in candidate_sets[1:]:
+                matches &= candidates
+            return list(matches)
+
+    def search(self, query, limit=10, min_score=0.5):
+        """
+        Ranks items by how many of the query's trigrams their searchable fields share.
+
+        :param query: The (partial) text to look for.
+        :param limit: Maximum number of item IDs returned.
+        :param min_score: Minimum fraction of the query's trigrams an item must contain.
+        :return: A list of item IDs, best match first.
+        """
+        with self._lock:
+            if not self.searchable_fields:
+                raise ValueError("No searchable fields are configured.")
+            query_grams = [self._gram_token(gram) for gram in trigrams(query)]
+            if not query_grams:
+                return []
+            shared_counts = Counter()
+            for gram in query_grams:
+                shared_counts.update(self._by_gram.get(gram, ()))
+
+            ranked = []
+            for item_id, shared in shared_counts.items():
+                score = shared / len(query_grams)
+                if score >= min_score:
+                    # Break ties in favour of items with fewer unrelated trigrams
+                    similarity = shared / (len(query_grams) + len(self._entries[item_id][2]) - shared)
+                    ranked.append((score, similarity, item_id))
+            ranked.sort(reverse=True)
+            return [item_id for _, _, item_id in ranked[:limit]]
+
+    def _insert(self, item_id, item_type, tokens, grams):
+        tokens = tuple(tokens)
+        grams = [grams[i:i + GRAM_TOKEN_SIZE] for i in range(0, len(grams), GRAM_TOKEN_SIZE)]
+        self._entries[item_id] = (item_type, tokens, grams)
+        self._by_type.setdefault(item_type, set()).add(item_id)
+        for token in tokens:
+            self._by_token.setdefault(token, set()).add(item_id)
+        for gram in grams:
+            self._by_gram.setdefault(gram, set()).add(item_id)
+
+    def _token(self, name, value):
+        message = f"{name}\x00{normalize_value(name, value)}".encode()
+        return hmac.new(self._blind_key, message, hashlib.sha256).hexdigest()[:32]
+
+    def _hash_gram(self, gram):
+        # Called through the _gram_token cache
+        return hmac.new(self._gram_key, gram.encode(), hashlib.sha256).hexdigest()[:GRAM_TOKEN_SIZE]
+
+
+def normalize_value(name, value):
+    """
+    Normalizes a field value for exact-match lookups: URLs are reduced to their
+    host name (without 'www.'), everything else is trimmed and case-folded.
+
+    :param name: The field name.
+    :param value: The plaintext value.
+    """
+    value = value.strip().casefold()
+    if name in URL_FIELDS:
+        try:
+            host = urlsplit(value if "://" in value else "//" + value).hostname or value
+        except ValueError:
+            # Not parseable as a URL (e.g. an unclosed '[' in the host): match it as typed
+            return value
+        value = host[4:] if host.startswith("www.") else host
+    return value
+
+
+def trigrams(text):
+    """
+    Splits text into the set of trigrams of its case-folded words, each word
+    padded with two leading spaces and one trailing space.
+
+    :param text: The text to split.
+    """
+    grams = set()
+    for word in re.findall(r"\w+", text.casefold()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _discard(index, key, item_id):
+    item_ids = index.get(key)
+    if item_ids is not None:
+        item_ids.discard(item_id)
+        if not item_ids:
+            del index[key]
+
+
+# Example usage
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import random
+    import time
+    from cryptography.fernet import Fernet
+    from vault import Vault
+
+    words = ["".join(random.choices("abcdefghijklmnopqrstuvwxyz", k=random.randint(4, 9))) for _ in range(5000)]
+    words[:2] = ["charlie", "delta"]
+    vault = Vault(Fernet.generate_key(), item_encryption="item", searchable_fields=("name", "url"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        for n in range(100000):
+            name = f"{random.choice(words)} {random.choice(words)} {n}"
+            vault.create_item("Login", {"name": name, "url": f"{name.split()[0]}.example.com"})
+    query = "charlie deta"
+
+    start = time.perf_counter()
+    matches = vault.search(query)
+    print(f"Trigram search: {len(matches)} results in {(time.perf_counter() - start) * 1000:.1f} ms (includes building the index)")
+    start = time.perf_counter()
+    matches = vault.search(query)
+    print(f"Trigram search: {len(matches)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    scanned = [item_id for item_id, item in vault.iter_decrypted_items(list(vault.data))
+               if all(word in item["fields"]["name"] for word in query.split())]
+    print(f"Decrypt and scan: {len(scanned)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
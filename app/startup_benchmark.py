@@ -0,0 +1,84 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+# Measures how long the command-line app takes to start, using `python -X importtime`
+# for the import cost of each module and wall-clock runs of `main.py list` for the
+# whole cold start. With --budget-ms it exits with status 1 when importing main
+# takes longer than the budget, so it can run as a check.
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def measure_imports(module="main"):
+    """
+    Imports a module in a fresh interpreter with -X importtime.
+
+    :param module: The module to import.
+    :return: A list of (module name, cumulative microseconds, nesting depth), in import order.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=_environment(), check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            imports.append((match[4], int(match[2]), len(match[3]) // 2))
+    return imports
+
+
+def measure_command(args, runs=5):
+    """
+    Runs main.py in a fresh interpreter several times, in a scratch directory.
+
+    :param args: The command-line arguments for main.py.
+    :param runs: Number of runs.
+    :return: The fastest run in seconds.
+    """
+    timings = []
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(APP_DIR, "main.py"), *args], cwd=directory,
+                           env=_environment(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _environment():
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join([APP_DIR, os.path.join(APP_DIR, "utils")])
+    return environment
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the startup time of main.py.")
+    parser.add_argument("--budget-ms", type=float, help="fail if importing main takes longer than this")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to show")
+    args = parser.parse_args()
+
+    imports = measure_imports()
+    # A module is listed after everything it imports, so main's direct imports are
+    # the depth-1 entries between main and the previous top-level entry
+    position = next(index for index, (name, _, depth) in enumerate(imports) if name == "main" and depth == 0)
+    total_ms = imports[position][1] / 1000
+    print(f"import main: {total_ms:.1f} ms")
+    direct = []
+    for name, cumulative, depth in reversed(imports[:position]):
+        if depth == 0:
+            break
+        if depth == 1:
+            direct.append((name, cumulative))
+    for name, cumulative in sorted(direct, key=lambda entry: -entry[1])[:args.top]:
+        print(f"  {name:<20} {cumulative / 1000:6.1f} ms")
+    loaded = {name for name, _, _ in imports}
+    print("Loads cryptography:", "cryptography" in loaded, "| loads pyperclip:", "pyperclip" in loaded)
+    print(f"main.py list (cold start, best of 5): {measure_command(['list']) * 1000:.0f} ms")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"Over budget: {total_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        sys.exit(1)
@@ -0,0 +1,393 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from vault_format import MappedVaultData, decode_record, encode_record, read_vault, save_vault_file
+
+# Vault.data can be any MutableMapping of item ID -> stored item. Storage classes
+# may also provide:
+#   item_types()        yields (item_id, item_type) pairs without decoding items
+#   compact()           folds a write-ahead log into the main file
+#   close()             flushes and releases files
+#   header              dictionary of vault metadata (e.g. key derivation parameters)
+#   set_header(header)  replaces and durably stores the metadata
+#   rewrite(items, header)  replaces items and the metadata in one atomic step
+
+
+class JournalStorage(MutableMapping):
+    def __init__(self, snapshot_path, journal_path=None, compact_every=1000, format=None):
+        """
+        Initializes a journaled item store.
+
+        Items live in memory like a normal dict. Every write or delete is also
+        appended to a journal file and fsync'd, so a save only costs the size of
+        the changed item. Once the journal holds `compact_every` records, and at
+        least half as many records as there are items (so large imports don't
+        rewrite the snapshot over and over), it is folded into the snapshot file
+        and truncated.
+
+        :param snapshot_path: The path of the snapshot file (any format Vault.save_to_file writes).
+        :param journal_path: The path of the journal file. Defaults to '<snapshot_path>.journal'.
+        :param compact_every: Number of journal records that triggers a compaction.
+        :param format: Snapshot format ('json' or 'binary'). Defaults to the format of the existing snapshot.
+                       An existing snapshot in the other format is converted right away.
+        """
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or snapshot_path + ".journal"
+        self.compact_every = compact_every
+        self._items = {}
+        self.header = {}
+        self._records = 0
+        self._batch_depth = 0
+        self._lock = threading.RLock()
+
+        self._load_snapshot()
+        snapshot_format = "binary" if isinstance(self._items, MappedVaultData) else "json"
+        self.format = format or snapshot_format
+        self._replay_journal()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if self.format != snapshot_format and os.path.exists(self.snapshot_path):
+            self.compact()
+
+    def __getitem__(self, item_id):
+        return self._items[item_id]
+
+    def __setitem__(self, item_id, item):
+        with self._lock:
+            self._items[item_id] = item
+            self._append({"op": "put", "id": item_id, "item": item})
+
+    def __delitem__(self, item_id):
+        with self._lock:
+            del self._items[item_id]
+            self._append({"op": "del", "id": item_id})
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item_id):
+        return item_id in self._items
+
+    def item_types(self):
+        """
+        Yields (item_id, item_type) pairs, without decoding items when the snapshot is binary.
+        """
+        if isinstance(self._items, MappedVaultData):
+            return self._items.item_types()
+        return ((item_id, item["type"]) for item_id, item in self._items.items())
+
+    def set_header(self, header):
+        """
+        Replaces the vault metadata and writes it to the snapshot right away.
+
+        :param header: A dictionary of metadata.
+        """
+        with self._lock:
+            self.header = dict(header)
+            self.compact()
+
+    def rewrite(self, items, header):
+        """
+        Replaces items and the metadata together, e.g. when every item is
+        re-encrypted under a new key. The journal is emptied first and the new
+        state goes straight into the snapshot, so a crash leaves either the old
+        or the new vault, never a mix of both.
+
+        :param items: An iterable of (item_id, item) pairs.
+        :param header: A dictionary of metadata.
+        """
+        with self._lock:
+            self.compact()
+            self._items.update(items)
+            self.header = dict(header)
+            self.compact()
+
+    def compact(self):
+        """
+        Writes all items to the snapshot file and empties the journal.
+        """
+        with self._lock:
+            self._items = save_vault_file(self.snapshot_path, self._items, self.format, self.header)
+
+            self._journal.close()
+            self._journal = open(self.journal_path, "w", encoding="utf-8")
+            self._sync()
+            self._records = 0
+
+    def close(self):
+        """
+        Forces the journal to disk and closes it. Pending records stay in the
+        journal and are replayed on the next open; they are only folded into the
+        snapshot once the journal reaches the compaction threshold.
+        """
+        with self._lock:
+            if self._journal.closed:
+                return
+            self._sync()
+            self._journal.close()
+
+    def _append(self, record):
+        """
+        Appends one record to the journal and forces it to disk.
+
+        :param record: A JSON-serializable dictionary describing the change.
+        """
+        self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._records += 1
+        if not self._batch_depth:
+            self._sync()
+            self._compact_if_due()
+
+    @contextmanager
+    def batch(self):
+        """
+        Defers the fsync (and any compaction) of the records written inside the
+        block to the end of the block.
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self._sync()
+                    self._compact_if_due()
+
+    def _compact_if_due(self):
+        if self._records >= self.compact_every and self._records * 2 >= len(self._items):
+            self.compact()
+
+    def _sync(self):
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _load_snapshot(self):
+        try:
+            self._items, self.header = read_vault(self.snapshot_path)
+        except FileNotFoundError:
+            self._items = {}
+
+    def _replay_journal(self):
+        """
+        Applies the journal on top of the snapshot. A torn final record left by
+        a crash mid-write is dropped and cut from the file.
+        """
+        try:
+            file = open(self.journal_path, "r+", encoding="utf-8")
+        except FileNotFoundError:
+            return
+
+        with file:
+            good_offset = 0
+            for line in iter(file.readline, ""):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Discarding incomplete journal record in {self.journal_path}.")
+                    file.truncate(good_offset)
+                    break
+                if record["op"] == "put":
+                    self._items[record["id"]] = record["item"]
+                elif record["op"] == "del":
+                    self._items.pop(record["id"], None)
+                good_offset = file.tell()
+                self._records += 1
+
+
+class SQLiteStorage(MutableMapping):
+    def __init__(self, db_path, cache_kib=None, page_size=500):
+        """
+        Initializes an item store backed by an SQLite database in WAL mode.
+
+        Each item is one row holding its type and its encoded record (raw
+        ciphertext, see vault_format.encode_record). Every write is committed
+        right away unless it runs inside batch(), and only the items being
+        accessed are held in memory. Vault metadata is kept in its own table.
+
+        The store can be shared between threads: they use one connection, and
+        every statement, as well as every batch() block as a whole, runs under a
+        lock, so no thread's writes end up in another thread's transaction.
+
+        :param db_path: The path of the database file.
+        :param cache_kib: Size limit of SQLite's page cache for this database, in KiB. Defaults to SQLite's (2000).
+        :param page_size: Number of rows items() reads per query.
+        """
+        self.db_path = db_path
+        self.page_size = page_size
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        try:
+            if cache_kib is not None:
+                self._connection.execute(f"PRAGMA cache_size=-{int(cache_kib)}")
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=FULL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS items (id TEXT PRIMARY KEY, type TEXT NOT NULL, record BLOB NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS items_type ON items (type)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.read_header()
+        except BaseException:
+            # Not a database (or a damaged one): don't leave the file open
+            self._connection.close()
+            raise
+
+    def __getitem__(self, item_id):
+        with self._lock:
+            row = self._connection.execute("SELECT type, record FROM items WHERE id = ?", (item_id,)).fetchone()
+        if row is None:
+            raise KeyError(item_id)
+        return decode_record(row[1], row[0])
+
+    def __setitem__(self, item_id, item):
+        record = encode_record(item)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO items (id, type, record) VALUES (?, ?, ?)", (item_id, item["type"], record)
+            )
+
+    def __delitem__(self, item_id):
+        with self._lock:
+            if self._connection.execute("DELETE FROM items WHERE id = ?", (item_id,)).rowcount == 0:
+                raise KeyError(item_id)
+
+    def __iter__(self):
+        # Fetched in full under the lock: a cursor left open between steps would
+        # keep a statement pending on the shared connection
+        with self._lock:
+            item_ids = self._connection.execute("SELECT id FROM items").fetchall()
+        for (item_id,) in item_ids:
+            yield item_id
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def __contains__(self, item_id):
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM items WHERE id = ?", (item_id,)).fetchone() is not None
+
+    def items(self):
+        """
+        Yields (item_id, item) pairs, reading `page_size` rows per query in ID order.
+        """
+        last_id = ""
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT id, type, record FROM items WHERE id > ? ORDER BY id LIMIT ?", (last_id, self.page_size)
+                ).fetchall()
+            for item_id, item_type, record in rows:
+                yield item_id, decode_record(record, item_type)
+            if len(rows) < self.page_size:
+                return
+            last_id = rows[-1][0]
+
+    def item_types(self):
+        """
+        Yields (item_id, item_type) pairs without decoding any record.
+        """
+        with self._lock:
+            return iter(self._connection.execute("SELECT id, type FROM items").fetchall())
+
+    def update_many(self, items):
+        """
+        Writes many items with one prepared statement in a single transaction.
+
+        :param items: An iterable of (item_id, item) pairs.
+        """
+        with self.batch():
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO items (id, type, record) VALUES (?, ?, ?)",
+                ((item_id, item["type"], encode_record(item)) for item_id, item in items),
+            )
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups the writes made inside the block into one transaction. Other
+        threads wait until the block ends.
+        """
+        with self._lock:
+            if self._connection.in_transaction:
+                yield
+                return
+            self._connection.execute("BEGIN")
+            try:
+                yield
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def read_header(self):
+        """
+        Reads the vault metadata from the database again, e.g. after another
+        connection to the same file changed it.
+
+        :return: The metadata, also kept in `header`.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM metadata WHERE key = 'header'").fetchone()
+            self.header = json.loads(row[0]) if row else {}
+            return self.header
+
+    def set_header(self, header):
+        """
+        Replaces the vault metadata.
+
+        :param header: A dictionary of metadata.
+        """
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('header', ?)",
+                                     (json.dumps(header),))
+            self.header = dict(header)
+
+    def rewrite(self, items, header):
+        """
+        Replaces items and the metadata in one transaction.
+
+        :param items: An iterable of (item_id, item) pairs.
+        :param header: A dictionary of metadata.
+        """
+        with self.batch():
+            self.update_many(items)
+            self.set_header(header)
+
+    def compact(self):
+        """
+        Checkpoints the write-ahead log into the database file and truncates it.
+        """
+        with self._lock:
+            self._connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """
+        Checkpoints and closes the database.
+        """
+        with self._lock:
+            self.compact()
+            self._connection.close()
+
+
+# Example usage
+if __name__ == "__main__":
+    storage = JournalStorage("journal_demo.json", compact_every=3)
+    storage["a"] = {"type": "Login", "fields": {}}
+    storage["b"] = {"type": "Note", "fields": {}}
+    del storage["a"]
+    print("Items after compaction:", dict(storage))
+    storage.close()
+
+    database = SQLiteStorage("sqlite_demo.db")
+    database.update_many([("a", {"type": "Login", "fields": {}}), ("b", {"type": "Note", "fields": {}})])
+    del database["a"]
+    print("Item types in the database:", list(database.item_types()))
+    database.close()
@@ -0,0 +1,214 @@
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from kdf import derive_key, new_kdf_params
+
+# Login hashes are cheaper than the vault key derivation: they run on every
+# login attempt, and a server may check many at once.
+DEFAULT_HASH_COST = {"n": 2 ** 14, "r": 8, "p": 1}
+
+
+class UserStore:
+    def __init__(self, db_path, hash_cost=None, max_failures=5, lockout_seconds=60, cache_size=4096):
+        """
+        Initializes a user account store backed by an SQLite database.
+
+        Accounts are looked up by email through the primary key index. Passwords
+        are kept as salted scrypt hashes and compared in constant time. Failed
+        attempts are remembered in memory: repeating a wrong password for an
+        account is rejected without hashing it again, and an account with
+        `max_failures` failures in `lockout_seconds` is locked for the rest of
+        that window. Unknown emails cost as much as known ones, so timing does
+        not reveal which accounts exist. The store can be shared between threads.
+
+        :param db_path: The path of the database file.
+        :param hash_cost: scrypt cost parameters for new hashes. Defaults to DEFAULT_HASH_COST.
+        :param max_failures: Failed attempts allowed per account within `lockout_seconds`.
+        :param lockout_seconds: Length of the rate limiting window.
+        :param cache_size: Maximum number of accounts and rejected attempts remembered.
+        """
+        self.db_path = db_path
+        self.hash_cost = dict(hash_cost or DEFAULT_HASH_COST)
+        self.max_failures = max_failures
+        self.lockout_seconds = lockout_seconds
+        self.cache_size = cache_size
+        self._connection = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS users (email TEXT PRIMARY KEY, kdf TEXT NOT NULL, hash TEXT NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        # Wrong passwords are remembered by keyed fingerprint, never in plain text
+        self._fingerprint_key = os.urandom(32)
+        self._rejected = OrderedDict()
+        self._failures = OrderedDict()
+        # Hashed when the email is unknown, so the attempt takes as long as a real one
+        self._dummy_params = new_kdf_params("scrypt", **self.hash_cost)
+        self._dummy_hash = derive_key(os.urandom(16).hex(), self._dummy_params).decode()
+
+    def add_user(self, email, password):
+        """
+        Creates an account.
+
+        :param email: The account email (case-insensitive).
+        :param password: The account password.
+        """
+        email = _normalize_email(email)
+        params, password_hash = self._hash(password)
+        try:
+            with self._lock:
+                self._connection.execute("INSERT INTO users (email, kdf, hash) VALUES (?, ?, ?)",
+                                         (email, json.dumps(params), password_hash))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"User {email} already exists.")
+        self._forget(email)
+
+    def change_password(self, email, password):
+        """
+        Replaces the password of an existing account.
+
+        :param email: The account email.
+        :param password: The new password.
+        """
+        email = _normalize_email(email)
+        params, password_hash = self._hash(password)
+        with self._lock:
+            changed = self._connection.execute("UPDATE users SET kdf = ?, hash = ? WHERE email = ?",
+                                               (json.dumps(params), password_hash, email)).rowcount
+        if not changed:
+            raise ValueError(f"User {email} not found.")
+        self._forget(email)
+
+    def delete_user(self, email):
+        """
+        Deletes an account.
+
+        :param email: The account email.
+        """
+        email = _normalize_email(email)
+        with self._lock:
+            self._connection.execute("DELETE FROM users WHERE email = ?", (email,))
+        self._forget(email)
+
+    def verify(self, email, password):
+        """
+        Checks a login attempt.
+
+        :param email: The account email.
+        :param password: The password to check.
+        :return: True if the password is right and the account is not locked out.
+        """
+        email = _normalize_email(email)
+        fingerprint = hmac.new(self._fingerprint_key, f"{email}\0{password}".encode(), hashlib.sha256).digest()
+        with self._lock:
+            if self._locked_out(email) or fingerprint in self._rejected:
+                self._record_failure(email, fingerprint)
+                return False
+            row = self._connection.execute("SELECT kdf, hash FROM users WHERE email = ?", (email,)).fetchone()
+
+        if row is None:
+            params, stored_hash = self._dummy_params, self._dummy_hash
+        else:
+            params, stored_hash = json.loads(row[0]), row[1]
+        # The slow part runs outside the lock; hashlib releases the GIL while hashing
+        matches = hmac.compare_digest(derive_key(password, params).decode(), stored_hash) and row is not None
+
+        if not matches:
+            with self._lock:
+                self._record_failure(email, fingerprint)
+            return False
+        with self._lock:
+            self._failures.pop(email, None)
+        if params["name"] != "scrypt" or any(params.get(name) != cost for name, cost in self.hash_cost.items()):
+            # Hashed with older costs; upgrade while the password is at hand
+            self.change_password(email, password)
+        return True
+
+    def is_locked_out(self, email):
+        """
+        Checks whether an account is locked after too many failed attempts.
+
+        :param email: The account email.
+        """
+        with self._lock:
+            return self._locked_out(_normalize_email(email))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def close(self):
+        """
+        Closes the database.
+        """
+        self._connection.close()
+
+    def _hash(self, password):
+        params = new_kdf_params("scrypt", **self.hash_cost)
+        return params, derive_key(password, params).decode()
+
+    def _locked_out(self, email):
+        entry = self._failures.get(email)
+        if entry is None:
+            return False
+        count, window_start = entry
+        if time.monotonic() - window_start >= self.lockout_seconds:
+            del self._failures[email]
+            return False
+        return count >= self.max_failures
+
+    def _record_failure(self, email, fingerprint):
+        count, window_start = self._failures.pop(email, (0, time.monotonic()))
+        self._failures[email] = (count + 1, window_start)
+        self._rejected[fingerprint] = True
+        self._rejected.move_to_end(fingerprint)
+        for cache in (self._failures, self._rejected):
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+
+    def _forget(self, email):
+        # A new password makes remembered rejections meaningless; they can't be
+        # matched to the email, so drop them all (the cache is small)
+        with self._lock:
+            self._failures.pop(email, None)
+            self._rejected.clear()
+
+
+def _normalize_email(email):
+    return email.strip().lower()
+
+
+# Example usage
+if __name__ == "__main__":
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = UserStore(os.path.join(directory, "users.db"))
+        for n in range(200):
+            store.add_user(f"user{n}@example.com", f"password-{n}")
+        print("Right password:", store.verify("USER1@example.com", "password-1"))
+        print("Wrong password:", store.verify("user1@example.com", "guess"))
+
+        def attempt(n):
+            return store.verify(f"user{n % 200}@example.com", f"password-{n % 200}")
+
+        for threads in (1, 4, 8):
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                start = time.perf_counter()
+                results = list(executor.map(attempt, range(200)))
+                elapsed = time.perf_counter() - start
+            print(f"{threads} threads: {len(results) / elapsed:,.0f} logins/s, all accepted: {all(results)}")
+
+        start = time.perf_counter()
+        for _ in range(10000):
+            store.verify("user2@example.com", "same wrong guess")
+        elapsed = time.perf_counter() - start
+        print(f"Repeated wrong password: {10000 / elapsed:,.0f} rejections/s, "
+              f"locked out: {store.is_locked_out('user2@example.com')}")
+        store.close()
@@ -1,4 +1,3 @@
-import pyperclip
 import threading
 import time
 
@@ -18,6 +17,8 @@ class ClipboardManager:
 
         :param data: The sensitive data to copy to the clipboard.
         """
+        # Imported on first use: pyperclip probes for clipboard backends when loaded
+        import pyperclip
         pyperclip.copy(data)
         print(f"Copied to clipboard: {data[:4]}{'*' * (len(data) - 4)}")  # Masked preview
 
@@ -33,6 +34,7 @@ class ClipboardManager:
         """
         Clears the clipboard contents for security purposes.
         """
+        import pyperclip
         pyperclip.copy("")  # Clears the clipboard
         print("Clipboard cleared.")
 
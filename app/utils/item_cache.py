@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class DecryptedItemCache:
+    def __init__(self, max_items=128, ttl=60):
+        """
+        Initializes a bounded LRU cache of decrypted vault items.
+
+        Field values are kept in bytearrays so they can be overwritten with zeros
+        when an entry is evicted, expires or is invalidated, instead of lingering
+        in memory until the garbage collector reclaims them. The cache can be
+        shared between threads.
+
+        `size` is the number of bytes of field values cached. If `on_resize` is
+        set, it is called with the change in bytes after every change, outside
+        the cache's lock.
+
+        :param max_items: Maximum number of items kept. 0 disables the cache.
+        :param ttl: Seconds an entry stays valid after it was stored.
+        """
+        self.max_items = max_items
+        self.ttl = ttl
+        self.size = 0
+        self.on_resize = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, item_id):
+        """
+        Returns a cached item, or None on a miss or an expired entry.
+
+        :param item_id: The ID of the item.
+        :return: The decrypted item as a new dictionary.
+        """
+        with self._lock:
+            entry = self._entries.get(item_id)
+            if entry is None:
+                return None
+            expires_at, item_type, fields = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(item_id)
+                return {"type": item_type, "fields": {name: value.decode() for name, value in fields.items()}}
+            freed = self._remove(item_id)
+        self._resized(-freed)
+        return None
+
+    def put(self, item_id, item):
+        """
+        Stores a decrypted item, evicting the least recently used entries past `max_items`.
+
+        :param item_id: The ID of the item.
+        :param item: The decrypted item.
+        """
+        if self.max_items <= 0:
+            return
+        fields = {name: bytearray(value.encode()) for name, value in item["fields"].items()}
+        with self._lock:
+            size = self.size
+            self._remove(item_id)
+            self._entries[item_id] = (time.monotonic() + self.ttl, item["type"], fields)
+            self.size += _size(fields)
+            while len(self._entries) > self.max_items:
+                self._remove(next(iter(self._entries)))
+            delta = self.size - size
+        self._resized(delta)
+
+    def invalidate(self, item_id):
+        """
+        Drops and wipes one entry, if present.
+
+        :param item_id: The ID of the item.
+        """
+        with self._lock:
+            freed = self._remove(item_id)
+        self._resized(-freed)
+
+    def clear(self):
+        """
+        Drops and wipes every entry.
+        """
+        with self._lock:
+            freed = self.size
+            while self._entries:
+                _, (_, _, fields) = self._entries.popitem()
+                _wipe(fields)
+            self.size = 0
+        self._resized(-freed)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, item_id):
+        # Returns the number of bytes freed
+        entry = self._entries.pop(item_id, None)
+        if entry is None:
+            return 0
+        _wipe(entry[2])
+        freed = _size(entry[2])
+        self.size -= freed
+        return freed
+
+    def _resized(self, delta):
+        if delta and self.on_resize is not None:
+            self.on_resize(delta)
+
+
+def _size(fields):
+    return sum(len(value) for value in fields.values())
+
+
+def _wipe(fields):
+    for value in fields.values():
+        value[:] = bytes(len(value))
+
+
+# Example usage
+if __name__ == "__main__":
+    cache = DecryptedItemCache(max_items=2, ttl=1)
+    cache.put("a", {"type": "Login", "fields": {"password": "pass123"}})
+    cache.put("b", {"type": "Login", "fields": {"password": "pass456"}})
+    cache.put("c", {"type": "Login", "fields": {"password": "pass789"}})
+    print("Evicted 'a':", cache.get("a") is None)
+    print("Cached 'c':", cache.get("c"))
+    time.sleep(1)
+    print("Expired 'c':", cache.get("c") is None)
@@ -0,0 +1,138 @@
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+# Key derivation parameters are stored in the vault header as a dictionary:
+#   {"name": "scrypt", "salt": <base64>, "n": 32768, "r": 8, "p": 1}
+#   {"name": "pbkdf2-sha256", "salt": <base64>, "iterations": 600000}
+# plus "check", a short HMAC of the derived key used to reject a wrong password
+# before any item is decrypted.
+DEFAULT_SCRYPT_COST = {"n": 2 ** 15, "r": 8, "p": 1}
+DEFAULT_PBKDF2_COST = {"iterations": 600000}
+SALT_SIZE = 16
+MAX_SCRYPT_MEMORY = 512 * 1024 * 1024
+
+
+def new_kdf_params(algorithm="scrypt", **cost):
+    """
+    Creates key derivation parameters with a fresh random salt.
+
+    :param algorithm: 'scrypt' or 'pbkdf2-sha256'.
+    :param cost: Cost parameters (n, r, p for scrypt; iterations for PBKDF2). Defaults apply for missing ones.
+    :return: A dictionary of parameters, without the key check.
+    """
+    if algorithm == "scrypt":
+        cost = {**DEFAULT_SCRYPT_COST, **cost}
+    elif algorithm == "pbkdf2-sha256":
+        cost = {**DEFAULT_PBKDF2_COST, **cost}
+    else:
+        raise ValueError(f"Unknown key derivation function: {algorithm}.")
+    return {"name": algorithm, "salt": base64.b64encode(os.urandom(SALT_SIZE)).decode(), **cost}
+
+
+def derive_key(password, params):
+    """
+    Derives a vault encryption key from a master password.
+
+    :param password: The master password.
+    :param params: Key derivation parameters, as made by new_kdf_params.
+    :return: The key, in the same urlsafe base64 form as Fernet.generate_key().
+    """
+    if not password:
+        raise ValueError("The master password cannot be empty.")
+    salt = base64.b64decode(params["salt"])
+    if params["name"] == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        # hashlib refuses to go past maxmem, which defaults to 32 MiB
+        raw_key = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=_scrypt_memory(n, r, p) * 2,
+                                 dklen=32)
+    elif params["name"] == "pbkdf2-sha256":
+        raw_key = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, params["iterations"], dklen=32)
+    else:
+        raise ValueError(f"Unknown key derivation function: {params['name']}.")
+    return base64.urlsafe_b64encode(raw_key)
+
+
+def key_check(key):
+    """
+    Computes the check value stored next to the parameters.
+
+    :param key: A derived key.
+    :return: A short hex string that reveals nothing useful about the key.
+    """
+    return hmac.new(base64.urlsafe_b64decode(key), b"MyPass key check", hashlib.sha256).hexdigest()[:16]
+
+
+def verify_key(key, params):
+    """
+    Checks a derived key against the check value in the parameters.
+
+    :param key: A derived key.
+    :param params: Key derivation parameters including "check".
+    :return: True if the key matches (or no check value is stored).
+    """
+    if "check" not in params:
+        return True
+    return hmac.compare_digest(key_check(key), params["check"])
+
+
+def calibrate(target_seconds=0.5, algorithm="scrypt", max_memory=MAX_SCRYPT_MEMORY):
+    """
+    Benchmarks this machine and picks the costliest parameters whose derivation
+    still takes about `target_seconds`.
+
+    For scrypt, n is doubled until the target is reached or the memory use
+    (128 * n * r bytes) would pass `max_memory`; past that point p is raised
+    instead, which costs time but no extra memory. For PBKDF2 the iteration
+    count is scaled from a short timing run.
+
+    :param target_seconds: The unlock time to aim for.
+    :param algorithm: 'scrypt' or 'pbkdf2-sha256'.
+    :param max_memory: The most memory scrypt may use, in bytes.
+    :return: A tuple (params, measured seconds), params with a fresh salt.
+    """
+    if algorithm == "pbkdf2-sha256":
+        iterations = 50000
+        elapsed = _time_derivation(new_kdf_params(algorithm, iterations=iterations))
+        iterations = max(100000, int(iterations * target_seconds / elapsed))
+        params = new_kdf_params(algorithm, iterations=iterations)
+        return params, _time_derivation(params)
+
+    if algorithm != "scrypt":
+        raise ValueError(f"Unknown key derivation function: {algorithm}.")
+    n, r, p = 2 ** 14, DEFAULT_SCRYPT_COST["r"], 1
+    elapsed = _time_derivation(new_kdf_params(algorithm, n=n, r=r, p=p))
+    # Doubling n roughly doubles the time, so stop when the next step would overshoot the most
+    while elapsed * 1.5 < target_seconds and _scrypt_memory(n * 2, r, p) <= max_memory:
+        n *= 2
+        elapsed = _time_derivation(new_kdf_params(algorithm, n=n, r=r, p=p))
+    if elapsed * 1.5 < target_seconds:
+        p = max(1, round(target_seconds / elapsed))
+        elapsed = _time_derivation(new_kdf_params(algorithm, n=n, r=r, p=p))
+    return new_kdf_params(algorithm, n=n, r=r, p=p), elapsed
+
+
+def _time_derivation(params):
+    start = time.perf_counter()
+    derive_key("calibration", params)
+    return time.perf_counter() - start
+
+
+def _scrypt_memory(n, r, p):
+    return 128 * r * (n + p + 2)
+
+
+# Example usage
+if __name__ == "__main__":
+    for algorithm in ("scrypt", "pbkdf2-sha256"):
+        params, elapsed = calibrate(0.25, algorithm)
+        cost = {name: value for name, value in params.items() if name not in ("name", "salt")}
+        print(f"{algorithm}: {cost} takes {elapsed * 1000:.0f} ms")
+
+    params = new_kdf_params()
+    key = derive_key("correct horse battery staple", params)
+    params["check"] = key_check(key)
+    print("Right password accepted:", verify_key(derive_key("correct horse battery staple", params), params))
+    print("Wrong password rejected:", not verify_key(derive_key("Tr0ub4dor&3", params), params))
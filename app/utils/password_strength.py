@@ -1,7 +1,12 @@
 import re
+import strength_estimator
+from password_generator import PasswordPolicy, generate_many
+
+_SPECIAL = re.compile(r"[!@#$%^&*(),.?\":{}|<>]")
 
 class PasswordStrengthChecker:
-    def __init__(self, min_length=8, require_upper=True, require_lower=True, require_digit=True, require_special=True):
+    def __init__(self, min_length=8, require_upper=True, require_lower=True, require_digit=True, require_special=True,
+                 min_score=3):
         """
         Initializes the PasswordStrengthChecker.
 
@@ -10,19 +15,29 @@ class PasswordStrengthChecker:
         :param require_lower: Whether at least one lowercase letter is required.
         :param require_digit: Whether at least one digit is required.
         :param require_special: Whether at least one special character is required.
+        :param min_score: Minimum estimated strength, from 0 (too guessable) to 4 (very unguessable).
+                          3 means more than about 10^8 guesses.
         """
         self.min_length = min_length
         self.require_upper = require_upper
         self.require_lower = require_lower
         self.require_digit = require_digit
         self.require_special = require_special
+        self.min_score = min_score
 
     def check_strength(self, password):
         """
         Checks the strength of the provided password.
 
+        The strength is estimated from the number of guesses an attacker would
+        need, knowing common passwords, words, names, keyboard walks, repeats,
+        sequences and dates, so "Password1!" is weak even though it has every
+        kind of character. The length and character requirements are checked
+        on top of that.
+
         :param password: The password to evaluate.
-        :return: A dictionary with 'is_strong' (bool) and a list of 'issues' (str).
+        :return: A dictionary with 'is_strong' (bool), a list of 'issues' (str),
+                 the estimated 'score' (0 to 4) and 'guesses'.
         """
         issues = []
 
@@ -38,11 +53,16 @@ class PasswordStrengthChecker:
         if self.require_digit and not any(char.isdigit() for char in password):
             issues.append("Password must include at least one digit.")
 
-        if self.require_special and not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
+        if self.require_special and not _SPECIAL.search(password):
             issues.append("Password must include at least one special character (e.g., !@#$%^&*).")
 
+        estimate = strength_estimator.estimate(password)
+        if estimate["score"] < self.min_score:
+            issues.append(f"Password is too easy to guess (about 10^{estimate['guesses_log10']:.0f} guesses).")
+            issues.extend(strength_estimator.feedback(estimate["sequence"]))
+
         is_strong = len(issues) == 0
-        return {"is_strong": is_strong, "issues": issues}
+        return {"is_strong": is_strong, "issues": issues, "score": estimate["score"], "guesses": estimate["guesses"]}
 
     def suggest_password(self, length=12):
         """
@@ -51,56 +71,52 @@ class PasswordStrengthChecker:
         :param length: The desired length of the password.
         :return: A strong password string.
         """
-        import random
-        import string
-
-        if length < self.min_length:
-            raise ValueError(f"Password length must be at least {self.min_length} characters.")
-
-        characters = string.ascii_letters + string.digits + "!@#$%^&*(),.?\":{}|<>"
-        password = "".join(random.choices(characters, k=length))
+        return self.suggest_passwords(1, length)[0]
 
-        # Ensure the password meets all requirements
-        if self.require_upper:
-            password = self._replace_random(password, random.choice(string.ascii_uppercase))
-        if self.require_lower:
-            password = self._replace_random(password, random.choice(string.ascii_lowercase))
-        if self.require_digit:
-            password = self._replace_random(password, random.choice(string.digits))
-        if self.require_special:
-            password = self._replace_random(password, random.choice("!@#$%^&*(),.?\":{}|<>"))
-
-        return password
-
-    @staticmethod
-    def _replace_random(password, replacement):
+    def suggest_passwords(self, count, length=12):
         """
-        Replaces a random character in the password with the specified replacement.
+        Generates strong passwords with the specified length. Each one is built
+        to contain every required character class, so none has to be fixed up.
 
-        :param password: The original password string.
-        :param replacement: The replacement character.
-        :return: The modified password string.
+        :param count: Number of passwords.
+        :param length: The desired length of the passwords.
+        :return: A list of strong password strings.
         """
-        import random
-        password = list(password)
-        index = random.randint(0, len(password) - 1)
-        password[index] = replacement
-        return "".join(password)
+        if length < self.min_length:
+            raise ValueError(f"Password length must be at least {self.min_length} characters.")
+
+        required = [name for name, wanted in (("uppercase", self.require_upper), ("lowercase", self.require_lower),
+                                              ("digits", self.require_digit), ("symbols", self.require_special))
+                    if wanted]
+        return generate_many(count, PasswordPolicy(length, require=required))
 
 
 # Example usage
 if __name__ == "__main__":
+    import time
+
     checker = PasswordStrengthChecker()
 
     # Check password strength
-    password = "WeakPass"
-    result = checker.check_strength(password)
-    if result["is_strong"]:
-        print("Password is strong.")
-    else:
-        print("Password is weak. Issues:")
-        for issue in result["issues"]:
-            print("-", issue)
+    for password in ("WeakPass", "Password1!"):
+        result = checker.check_strength(password)
+        if result["is_strong"]:
+            print(f"{password} is strong.")
+        else:
+            print(f"{password} is weak. Issues:")
+            for issue in result["issues"]:
+                print("-", issue)
 
     # Generate a strong password
     print("Generated strong password:", checker.suggest_password(12))
+
+    # Every suggestion must pass the checker, whatever its length
+    suggestions = [password for length in range(checker.min_length, 65)
+                   for password in checker.suggest_passwords(200, length)]
+    start = time.perf_counter()
+    failures = [password for password in suggestions if not checker.check_strength(password)["is_strong"]]
+    elapsed = time.perf_counter() - start
+    print(f"Suggested passwords failing the check: {len(failures)} of {len(suggestions)}, "
+          f"{elapsed / len(suggestions) * 1000:.3f} ms per check")
+    if failures:
+        raise AssertionError(f"Suggestions failed the strength check, e.g. {failures[:3]}")
@@ -0,0 +1,90 @@
+import ctypes
+import sys
+
+
+class SecretBuffer:
+    def __init__(self, data):
+        """
+        Holds a secret (such as a derived key) in a bytearray that can be
+        overwritten with zeros, unlike bytes or str. Where the OS allows it the
+        memory is also locked into RAM, so the secret never lands in swap.
+
+        :param data: The secret (bytes). The caller should drop its own copy.
+        """
+        if not data:
+            raise ValueError("A secret buffer cannot be empty.")
+        self._buffer = bytearray(data)
+        # Keeps the bytearray from being resized (and moved) while it is locked
+        self._view = (ctypes.c_char * len(self._buffer)).from_buffer(self._buffer)
+        self.locked = _lock_memory(self._view, len(self._buffer))
+
+    def __len__(self):
+        return len(self._buffer)
+
+    @property
+    def wiped(self):
+        return getattr(self, "_view", None) is None
+
+    def get(self):
+        """
+        Returns a copy of the secret.
+
+        :return: The secret (bytes).
+        """
+        if self.wiped:
+            raise ValueError("The secret has been wiped.")
+        return bytes(self._buffer)
+
+    def wipe(self):
+        """
+        Overwrites the secret with zeros and unlocks its memory. Safe to call more than once.
+        """
+        if self.wiped:
+            return
+        ctypes.memset(self._view, 0, len(self._buffer))
+        if self.locked:
+            _unlock_memory(self._view, len(self._buffer))
+            self.locked = False
+        self._view = None
+
+    def __del__(self):
+        self.wipe()
+
+
+def _memory_functions():
+    try:
+        if sys.platform == "win32":
+            kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+            return kernel32.VirtualLock, kernel32.VirtualUnlock, lambda result: result != 0
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.mlock, libc.munlock, lambda result: result == 0
+    except (OSError, AttributeError):
+        return None
+
+
+_MEMORY_FUNCTIONS = _memory_functions()
+if _MEMORY_FUNCTIONS:
+    for _function in _MEMORY_FUNCTIONS[:2]:
+        _function.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+
+
+def _lock_memory(view, size):
+    # Locking fails without privileges or past RLIMIT_MEMLOCK; the buffer still works, just unlocked
+    if _MEMORY_FUNCTIONS is None:
+        return False
+    lock, _, succeeded = _MEMORY_FUNCTIONS
+    return succeeded(lock(ctypes.addressof(view), size))
+
+
+def _unlock_memory(view, size):
+    _, unlock, _ = _MEMORY_FUNCTIONS
+    unlock(ctypes.addressof(view), size)
+
+
+# Example usage
+if __name__ == "__main__":
+    secret = SecretBuffer(b"a derived key, 32 bytes long...")
+    print("Locked in RAM:", secret.locked)
+    print("Secret:", secret.get())
+    secret.wipe()
+    print("Wiped:", secret.wiped, bytes(secret._buffer))
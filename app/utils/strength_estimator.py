@@ -0,0 +1,644 @@
+import bisect
+import functools
+import math
+import re
+import time
+
+# Estimates how many guesses an attacker needs for a password, after the zxcvbn
+# approach: find every piece of the password that matches a known pattern
+# (dictionary word, keyboard walk, repeat, sequence, date), give each the number
+# of guesses needed to find it that way, then search for the cheapest way to
+# cover the whole password with matches and brute-forced gaps. All the lookup
+# tables below are built once: the small ones when the module is imported, the
+# dictionaries when the first password is rated.
+
+# Guesses needed to cover a password with a sequence of m matches is
+# m! * (product of the matches' guesses) + this ** (m - 1): the attacker also
+# has to guess how many pieces there are and in which order they come
+MIN_GUESSES_BEFORE_GROWING_SEQUENCE = 10000
+MIN_SUBMATCH_GUESSES_SINGLE_CHAR = 10
+MIN_SUBMATCH_GUESSES_MULTI_CHAR = 50
+# Guesses below each threshold give scores 0 to 3; anything above scores 4
+SCORE_THRESHOLDS = (1e3 + 5, 1e6 + 5, 1e8 + 5, 1e10 + 5)
+# Only this many leading characters are analysed. More characters can only add
+# guesses, so the estimate for a longer password is a lower bound, and the work
+# per password stays bounded.
+MAX_PASSWORD_LENGTH = 64
+
+REFERENCE_YEAR = time.localtime().tm_year
+MIN_YEAR_SPACE = 20
+DATE_MIN_YEAR = 1000
+DATE_MAX_YEAR = 2050
+# In a run of more digits than this, dates are only looked for at its two ends
+# ("john19870512", "19870512!"); trying every offset of a long run floods the
+# search with overlapping dates for little gain
+MAX_DATE_DIGIT_RUN = 16
+
+# Brute-force alphabet sizes, by the kinds of characters seen
+_CLASS_SIZES = ((re.compile(r"[a-z]"), 26), (re.compile(r"[A-Z]"), 26), (re.compile(r"[0-9]"), 10),
+                (re.compile(r"[ -/:-@\[-`{-~]"), 33), (re.compile(r"[^\x20-\x7e]"), 100))
+
+# Pieces up to this long are looked up in a set of word prefixes, longer ones
+# in the sorted word list
+SHORT_PREFIX_LENGTH = 3
+# Dictionary name -> the list in strength_dictionaries it is read from
+DICTIONARIES = (("passwords", "PASSWORDS"), ("english", "ENGLISH"), ("tv_and_film", "TV_AND_FILM"),
+                ("surnames", "SURNAMES"), ("male_names", "MALE_NAMES"), ("female_names", "FEMALE_NAMES"))
+
+# Common character substitutions: character -> the letters it can stand for
+L33T_TABLE = {"4": "a", "@": "a", "8": "b", "(": "c", "{": "c", "[": "c", "<": "c", "3": "e", "6": "g", "9": "g",
+              "1": "il", "!": "i", "|": "il", "7": "lt", "0": "o", "$": "s", "5": "s", "+": "t", "%": "x", "2": "z"}
+# Character -> the characters a dictionary word may have in its place
+_READINGS = {character: (character, *letters) for character, letters in L33T_TABLE.items()}
+
+_START_UPPER = re.compile(r"^[A-Z][^A-Z]+$")
+_END_UPPER = re.compile(r"^[^A-Z]+[A-Z]$")
+_ALL_UPPER = re.compile(r"^[^a-z]+$")
+
+_REPEAT_GREEDY = re.compile(r"(.+)\1+", re.DOTALL)
+_REPEAT_LAZY = re.compile(r"(.+?)\1+", re.DOTALL)
+_REPEAT_LAZY_ANCHORED = re.compile(r"^(.+?)\1+$", re.DOTALL)
+
+_SEQUENCE_MAX_DELTA = 5
+_RECENT_YEAR = re.compile(r"19\d\d|20\d\d")
+_DIGIT_RUN = re.compile(r"\d{4,}")
+_DATE_WITH_SEPARATOR = re.compile(r"^(\d{1,4})([\s/\\_.-])(\d{1,2})\2(\d{1,4})$")
+# Where to split a run of digits of each length into day, month and year
+_DATE_SPLITS = {4: ((1, 2), (2, 3)), 5: ((1, 3), (2, 3)), 6: ((1, 2), (2, 4), (4, 5)),
+                7: ((1, 3), (2, 3), (4, 5), (4, 6)), 8: ((2, 4), (4, 6))}
+
+_QWERTY = """
+`~ 1! 2@ 3# 4$ 5% 6^ 7& 8* 9( 0) -_ =+
+    qQ wW eE rR tT yY uU iI oO pP [{ ]} \\|
+     aA sS dD fF gG hH jJ kK lL ;: '"
+      zZ xX cC vV bB nN mM ,< .> /?
+"""
+_KEYPAD = """
+  / * -
+7 8 9 +
+4 5 6
+1 2 3
+  0 .
+"""
+_SHIFTED = re.compile(r"[~!@#$%^&*()_+QWERTYUIOP{}|ASDFGHJKL:\"ZXCVBNM<>?]")
+
+
+def _keyboard_graph(layout, slanted):
+    # Character -> the keys around its key, one slot per direction (None where
+    # there is no key), after zxcvbn's adjacency graph builder
+    positions = {}
+    unit = len(layout.split()[0]) + 1
+    for y, line in enumerate(layout.split("\n")):
+        slant = y - 1 if slanted else 0
+        for token in line.split():
+            positions[((line.index(token) - slant) // unit, y)] = token
+    if slanted:
+        directions = ((-1, 0), (0, -1), (1, -1), (1, 0), (0, 1), (-1, 1))
+    else:
+        directions = ((-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1))
+    graph = {}
+    for (x, y), characters in positions.items():
+        for character in characters:
+            graph[character] = [positions.get((x + dx, y + dy)) for dx, dy in directions]
+    return graph
+
+
+# Graph name -> (graph, number of starting keys, average number of neighbours)
+KEYBOARD_GRAPHS = {}
+for _name, _graph in (("qwerty", _keyboard_graph(_QWERTY, True)), ("keypad", _keyboard_graph(_KEYPAD, False))):
+    _degree = sum(len([key for key in keys if key]) for keys in _graph.values()) / len(_graph)
+    KEYBOARD_GRAPHS[_name] = (_graph, len(_graph), _degree)
+
+_FACTORIALS = [math.factorial(n) for n in range(MAX_PASSWORD_LENGTH + 1)]
+
+
+def estimate(password):
+    """
+    Estimates how hard a password is to guess.
+
+    :param password: The password to evaluate. Only the first MAX_PASSWORD_LENGTH characters are used.
+    :return: A dictionary with 'guesses' (float), 'guesses_log10', 'score' (0 to 4,
+             from too guessable to very unguessable) and 'sequence', the list of
+             matches (dictionaries with 'pattern', 'i', 'j', 'token', 'guesses',
+             ...) that the estimate is based on.
+    """
+    password = password[:MAX_PASSWORD_LENGTH]
+    guesses, sequence = _most_guessable(password, _omnimatch(password))
+    score = next((score for score, threshold in enumerate(SCORE_THRESHOLDS) if guesses < threshold), 4)
+    return {"guesses": guesses, "guesses_log10": math.log10(guesses), "score": score, "sequence": sequence}
+
+
+def feedback(sequence):
+    """
+    Explains the weakest part of a password.
+
+    :param sequence: The 'sequence' of an estimate().
+    :return: A list of warnings (str), possibly empty.
+    """
+    matches = [match for match in sequence if match["pattern"] != "bruteforce"]
+    if not matches:
+        return []
+    match = max(matches, key=lambda match: len(match["token"]))
+    pattern = match["pattern"]
+    if pattern == "dictionary":
+        warnings = [_dictionary_warning(match, len(sequence) == 1)]
+        if _START_UPPER.match(match["token"]):
+            warnings.append("Capitalizing the first letter doesn't help very much.")
+        elif _ALL_UPPER.match(match["token"]) and match["token"].lower() != match["token"]:
+            warnings.append("All-uppercase is almost as easy to guess as all-lowercase.")
+        if match.get("l33t"):
+            warnings.append("Predictable substitutions like '@' instead of 'a' don't help very much.")
+        return warnings
+    if pattern == "spatial":
+        return ["Straight rows of keys are easy to guess." if match["turns"] == 1
+                else "Short keyboard patterns are easy to guess."]
+    if pattern == "repeat":
+        return ['Repeats like "aaa" are easy to guess.' if len(match["base_token"]) == 1
+                else 'Repeats like "abcabcabc" are only slightly harder to guess than "abc".']
+    if pattern == "sequence":
+        return ["Sequences like abc or 6543 are easy to guess."]
+    if pattern == "year":
+        return ["Recent years are easy to guess."]
+    return ["Dates are often easy to guess."]
+
+
+def _dictionary_warning(match, whole_password):
+    if match["dictionary"] == "passwords":
+        if whole_password and not match["l33t"] and not match["reversed"]:
+            return "This is a very common password." if match["rank"] <= 100 else "This is a common password."
+        return "This is similar to a commonly used password."
+    if match["dictionary"] in ("english", "tv_and_film"):
+        return "A word by itself is easy to guess." if whole_password else "Common words are easy to guess."
+    return "Names and surnames by themselves are easy to guess." if whole_password \
+        else "Common names and surnames are easy to guess."
+
+
+# Matchers
+
+def _omnimatch(password):
+    matches = (_dictionary_matches(password) + _reversed_dictionary_matches(password) + _spatial_matches(password)
+               + _repeat_matches(password) + _sequence_matches(password) + _year_matches(password)
+               + _date_matches(password))
+    length = len(password)
+    for match in matches:
+        guesses = _GUESSES[match["pattern"]](match)
+        if len(match["token"]) < length:
+            # A piece of a longer password is never guessed in fewer tries than this
+            floor = MIN_SUBMATCH_GUESSES_SINGLE_CHAR if len(match["token"]) == 1 else MIN_SUBMATCH_GUESSES_MULTI_CHAR
+            guesses = max(guesses, floor)
+        match["guesses"] = guesses
+    return matches
+
+
+def _dictionary_matches(password):
+    # Walks the words from each starting position, reading each character as
+    # itself or as a letter it is a common substitution for, and drops a reading
+    # as soon as no word starts with it. This finds plain words and words with
+    # any combination of substitutions ("p@ssw0rd123") in one pass.
+    ranked_words, sorted_words, short_prefixes = _ranked_words()
+    word_count = len(sorted_words)
+    lowered = password.lower()
+    length = len(lowered)
+    matches = []
+    for i in range(length - 2):
+        readings = [("", None)]
+        for j in range(i, length):
+            character = lowered[j]
+            short = j - i < SHORT_PREFIX_LENGTH
+            extended = []
+            for prefix, substitutions in readings:
+                for reading in _READINGS.get(character, character):
+                    piece = prefix + reading
+                    if short:
+                        if piece not in short_prefixes:
+                            continue
+                    else:
+                        # The first word sorting at or after the piece starts with it if any word does
+                        position = bisect.bisect_left(sorted_words, piece)
+                        if position == word_count or not sorted_words[position].startswith(piece):
+                            continue
+                    if reading != character:
+                        if substitutions and substitutions.get(character, reading) != reading:
+                            # The same character can't stand for two letters in one word
+                            continue
+                        piece_substitutions = {**(substitutions or {}), character: reading}
+                    else:
+                        piece_substitutions = substitutions
+                    extended.append((piece, piece_substitutions))
+                    entry = ranked_words.get(piece) if j - i >= 2 else None
+                    if entry is not None:
+                        matches.append({"pattern": "dictionary", "i": i, "j": j, "token": password[i:j + 1],
+                                        "matched_word": piece, "rank": entry[0], "dictionary": entry[1],
+                                        "reversed": False, "l33t": piece_substitutions is not None,
+                                        "sub": piece_substitutions or {}})
+            if not extended:
+                break
+            readings = extended
+    return matches
+
+
+@functools.cache
+def _ranked_words():
+    # Word -> (rank, dictionary), a word in several lists keeping its best rank,
+    # all the words in sorted order, and the set of their short prefixes. Most
+    # "does any word start with this?" questions are about short pieces and are
+    # answered by the set; longer pieces take a binary search in the sorted
+    # list, since a set of every prefix would take several times the memory of
+    # the words themselves.
+    import strength_dictionaries
+    ranked_words = {}
+    for name, attribute in DICTIONARIES:
+        for rank, word in enumerate(getattr(strength_dictionaries, attribute), 1):
+            if rank < ranked_words.get(word, (math.inf,))[0]:
+                ranked_words[word] = (rank, name)
+    short_prefixes = frozenset(word[:end] for word in ranked_words for end in range(1, SHORT_PREFIX_LENGTH + 1))
+    return ranked_words, sorted(ranked_words), short_prefixes
+
+
+def _reversed_dictionary_matches(password):
+    length = len(password)
+    matches = []
+    for match in _dictionary_matches(password[::-1]):
+        if match["matched_word"] == match["matched_word"][::-1]:
+            continue
+        i, j = length - 1 - match["j"], length - 1 - match["i"]
+        match.update(i=i, j=j, token=password[i:j + 1], reversed=True)
+        matches.append(match)
+    return matches
+
+
+def _spatial_matches(password):
+    matches = []
+    length = len(password)
+    for name, (graph, _, _) in KEYBOARD_GRAPHS.items():
+        i = 0
+        while i < length - 1:
+            j = i + 1
+            last_direction = None
+            turns = 0
+            shifted = 1 if name == "qwerty" and _SHIFTED.match(password[i]) else 0
+            while j < length:
+                character = password[j]
+                for direction, keys in enumerate(graph.get(password[j - 1], ())):
+                    if keys and character in keys:
+                        if keys.index(character) == 1:
+                            shifted += 1
+                        if direction != last_direction:
+                            turns += 1
+                            last_direction = direction
+                        break
+                else:
+                    break
+                j += 1
+            if j - i > 2:
+                matches.append({"pattern": "spatial", "i": i, "j": j - 1, "token": password[i:j], "graph": name,
+                                "turns": turns, "shifted_count": shifted})
+            i = j
+    return matches
+
+
+def _repeat_matches(password):
+    matches = []
+    # Base token -> its guesses and sequence; a long run repeats the same units
+    scored = {}
+    position = 0
+    while position < len(password):
+        greedy = _REPEAT_GREEDY.search(password, position)
+        if not greedy:
+            break
+        lazy = _REPEAT_LAZY.search(password, position)
+        if len(greedy[0]) > len(lazy[0]):
+            # "aabaab": the greedy match covers more; its shortest repeating unit is "aab"
+            match, base_token = greedy, _REPEAT_LAZY_ANCHORED.match(greedy[0])[1]
+        else:
+            match, base_token = lazy, lazy[1]
+        i, j = match.start(), match.end() - 1
+        if base_token not in scored:
+            scored[base_token] = _most_guessable(base_token, _omnimatch(base_token))
+        base_guesses, base_sequence = scored[base_token]
+        matches.append({"pattern": "repeat", "i": i, "j": j, "token": match[0], "base_token": base_token,
+                        "base_guesses": base_guesses, "base_sequence": base_sequence,
+                        "repeat_count": len(match[0]) // len(base_token)})
+        position = j + 1
+    return matches
+
+
+def _sequence_matches(password):
+    # Runs of characters with the same step between code points, like "abc", "9753" or "zyx"
+    if len(password) < 2:
+        return []
+    matches = []
+
+    def add(i, j, delta):
+        if (j - i > 1 or abs(delta) == 1) and 0 < abs(delta) <= _SEQUENCE_MAX_DELTA:
+            matches.append({"pattern": "sequence", "i": i, "j": j, "token": password[i:j + 1], "ascending": delta > 0})
+
+    i = 0
+    last_delta = None
+    for k in range(1, len(password)):
+        delta = ord(password[k]) - ord(password[k - 1])
+        if last_delta is None:
+            last_delta = delta
+        if delta == last_delta:
+            continue
+        add(i, k - 1, last_delta)
+        i = k - 1
+        last_delta = delta
+    add(i, len(password) - 1, last_delta)
+    return matches
+
+
+def _year_matches(password):
+    return [{"pattern": "year", "i": match.start(), "j": match.end() - 1, "token": match[0]}
+            for match in _RECENT_YEAR.finditer(password)]
+
+
+def _date_matches(password):
+    matches = []
+    length = len(password)
+    # Only the longest date at each start can survive the filter below, so each
+    # start tries its longest token first. Long digit runs repeat the same tokens
+    # ("19871987..."), so each token is parsed once.
+    parsed = {}
+    for run in _DIGIT_RUN.finditer(password):
+        run_start, run_end = run.span()
+        starts = range(run_start, run_end - 3)
+        if run_end - run_start > MAX_DATE_DIGIT_RUN:
+            starts = [*range(run_start, run_start + 8), *range(run_end - 8, run_end - 3)]
+        for i in starts:
+            for j in range(min(run_end, i + 8) - 1, i + 2, -1):
+                token = password[i:j + 1]
+                date = parsed.get(token, False)
+                if date is False:
+                    candidates = [_to_date(int(token[:k]), int(token[k:l]), int(token[l:]))
+                                  for k, l in _DATE_SPLITS[len(token)]]
+                    candidates = [candidate for candidate in candidates if candidate]
+                    date = min(candidates, key=lambda candidate: abs(candidate[0] - REFERENCE_YEAR)) \
+                        if candidates else None
+                    parsed[token] = date
+                if date:
+                    matches.append({"pattern": "date", "i": i, "j": j, "token": token, "separator": "",
+                                    "year": date[0], "month": date[1], "day": date[2]})
+                    break
+    for i in range(length - 5):
+        for j in range(min(length, i + 10) - 1, i + 4, -1):
+            token = password[i:j + 1]
+            match = _DATE_WITH_SEPARATOR.match(token)
+            date = match and _to_date(int(match[1]), int(match[3]), int(match[4]))
+            if date:
+                matches.append({"pattern": "date", "i": i, "j": j, "token": token, "separator": match[2],
+                                "year": date[0], "month": date[1], "day": date[2]})
+                break
+    # "1/1/91" also matches as "1/1/9"; keep only the longest dates. Sorted by
+    # start and then longest first, a date is contained in an earlier one
+    # exactly when it ends no later than the furthest end seen so far.
+    matches.sort(key=lambda match: (match["i"], -match["j"]))
+    longest = []
+    furthest = -1
+    for match in matches:
+        if match["j"] > furthest:
+            longest.append(match)
+            furthest = match["j"]
+    return longest
+
+
+def _to_date(first, middle, last):
+    # Reads three numbers as a day, month and year in any common order
+    if not 0 < middle <= 31:
+        return None
+    numbers = (first, middle, last)
+    if any(99 < number < DATE_MIN_YEAR or number > DATE_MAX_YEAR for number in numbers):
+        return None
+    if (sum(number > 31 for number in numbers) >= 2 or sum(number > 12 for number in numbers) == 3
+            or sum(number <= 0 for number in numbers) >= 2):
+        return None
+    splits = ((last, (first, middle)), (first, (middle, last)))
+    for year, rest in splits:
+        if DATE_MIN_YEAR <= year <= DATE_MAX_YEAR:
+            day_month = _to_day_month(*rest)
+            return (year, *day_month[::-1]) if day_month else None
+    for year, rest in splits:
+        day_month = _to_day_month(*rest)
+        if day_month:
+            year = year if year > 99 else year + 1900 if year > 50 else year + 2000
+            return year, day_month[1], day_month[0]
+    return None
+
+
+def _to_day_month(first, second):
+    for day, month in ((first, second), (second, first)):
+        if 1 <= day <= 31 and 1 <= month <= 12:
+            return day, month
+    return None
+
+
+# Guesses per pattern
+
+def _n_choose_k(n, k):
+    return math.comb(n, k) if 0 <= k <= n else 0
+
+
+def _dictionary_guesses(match):
+    return (match["rank"] * _uppercase_variations(match["token"]) * _l33t_variations(match)
+            * (2 if match["reversed"] else 1))
+
+
+def _uppercase_variations(word):
+    if word.lower() == word:
+        return 1
+    if _START_UPPER.match(word) or _END_UPPER.match(word) or _ALL_UPPER.match(word):
+        return 2
+    upper = sum(character.isupper() for character in word)
+    lower = sum(character.islower() for character in word)
+    return sum(_n_choose_k(upper + lower, k) for k in range(1, min(upper, lower) + 1))
+
+
+def _l33t_variations(match):
+    if not match["l33t"]:
+        return 1
+    variations = 1
+    token = match["token"].lower()
+    for substituted, letter in match["sub"].items():
+        substituted_count, plain_count = token.count(substituted), token.count(letter)
+        if not substituted_count or not plain_count:
+            # Every such letter is substituted, or none: the attacker tries both
+            variations *= 2
+        else:
+            total = substituted_count + plain_count
+            variations *= sum(_n_choose_k(total, k) for k in range(1, min(substituted_count, plain_count) + 1))
+    return variations
+
+
+def _spatial_guesses(match):
+    _, starts, degree = KEYBOARD_GRAPHS[match["graph"]]
+    length, turns = len(match["token"]), match["turns"]
+    guesses = 0
+    for walk_length in range(2, length + 1):
+        for walk_turns in range(1, min(turns, walk_length - 1) + 1):
+            guesses += _n_choose_k(walk_length - 1, walk_turns - 1) * starts * degree ** walk_turns
+    shifted = match["shifted_count"]
+    if shifted:
+        unshifted = length - shifted
+        if not unshifted:
+            guesses *= 2
+        else:
+            guesses *= sum(_n_choose_k(length, k) for k in range(1, min(shifted, unshifted) + 1))
+    return guesses
+
+
+def _repeat_guesses(match):
+    return match["base_guesses"] * match["repeat_count"]
+
+
+def _sequence_guesses(match):
+    token = match["token"]
+    if token[0] in "aAzZ019":
+        base = 4
+    elif token[0].isdigit():
+        base = 10
+    else:
+        base = 26
+    return base * (1 if match["ascending"] else 2) * len(token)
+
+
+def _year_guesses(match):
+    return max(abs(int(match["token"]) - REFERENCE_YEAR), MIN_YEAR_SPACE)
+
+
+def _date_guesses(match):
+    guesses = max(abs(match["year"] - REFERENCE_YEAR), MIN_YEAR_SPACE) * 365
+    return guesses * 4 if match["separator"] else guesses
+
+
+_GUESSES = {"dictionary": _dictionary_guesses, "spatial": _spatial_guesses, "repeat": _repeat_guesses,
+            "sequence": _sequence_guesses, "year": _year_guesses, "date": _date_guesses}
+
+
+# Search
+
+def _most_guessable(password, matches):
+    # Dynamic programming over prefixes: for every end position k and number of
+    # matches l, the cheapest way to cover password[:k + 1] with l matches
+    length = len(password)
+    if not length:
+        return 1.0, []
+    ending_at = [[] for _ in range(length)]
+    for match in matches:
+        ending_at[match["j"]].append(match)
+    best_match = [{} for _ in range(length)]
+    best_product = [{} for _ in range(length)]
+    best_guesses = [{} for _ in range(length)]
+    # Per position, the match counts whose cheapest cover ends with a pattern match
+    # rather than a brute-force gap; only those can be followed by a gap
+    ends_with_match = [[] for _ in range(length)]
+    classes = [_character_class(character) for character in password]
+    # Kinds of characters from each position to the end
+    suffix_masks = [0] * (length + 1)
+    for position in range(length - 1, -1, -1):
+        suffix_masks[position] = suffix_masks[position + 1] | classes[position]
+    # Guesses of the cheapest complete cover found so far: brute force, a single
+    # match such as a repeat, and then each prefix followed by a brute-forced
+    # rest. A partial cover already costing more can only grow, so it is dropped;
+    # this keeps the search small on long digit runs and repeats, where nearly
+    # every position starts some match.
+    bound = _bruteforce_guesses(suffix_masks[0], length, length) + 1
+    for match in ending_at[length - 1]:
+        if not match["i"]:
+            bound = min(bound, match["guesses"] + 1)
+
+    def update(start, end, guesses, match, count):
+        product = guesses * best_product[start - 1][count - 1] if count > 1 else guesses
+        total = _FACTORIALS[count] * product + MIN_GUESSES_BEFORE_GROWING_SEQUENCE ** (count - 1)
+        if total > bound:
+            return
+        # A sequence with more matches is only kept if it is also cheaper
+        for other_count, other_total in best_guesses[end].items():
+            if other_count <= count and other_total <= total:
+                return
+        best_guesses[end][count] = total
+        best_match[end][count] = match
+        best_product[end][count] = product
+
+    for end in range(length):
+        for match in ending_at[end]:
+            start = match["i"]
+            if start:
+                for count in list(best_match[start - 1]):
+                    update(start, end, match["guesses"], match, count + 1)
+            else:
+                update(0, end, match["guesses"], match, 1)
+        ends_with_match[end] = [count for count, match in best_match[end].items() if not isinstance(match, tuple)]
+
+        # Brute-force gaps, as (start, end) pairs; two gaps in a row would just be one longer gap
+        mask = 0
+        for start in range(end, -1, -1):
+            mask |= classes[start]
+            if start and not ends_with_match[start - 1]:
+                continue
+            guesses = _bruteforce_guesses(mask, end - start + 1, length)
+            if guesses + 1 > bound:
+                # Longer gaps only cost more
+                break
+            if start:
+                for count in ends_with_match[start - 1]:
+                    update(start, end, guesses, (start, end), count + 1)
+            else:
+                update(0, end, guesses, (0, end), 1)
+        # Gaps added above may have displaced pattern matches at this position
+        ends_with_match[end] = [count for count, match in best_match[end].items() if not isinstance(match, tuple)]
+        if end < length - 1:
+            rest = _bruteforce_guesses(suffix_masks[end + 1], length - end - 1, length)
+            for count in ends_with_match[end]:
+                total = (_FACTORIALS[count + 1] * (rest * best_product[end][count])
+                         + MIN_GUESSES_BEFORE_GROWING_SEQUENCE ** count)
+                bound = min(bound, total)
+
+    end = length - 1
+    count, guesses = min(best_guesses[end].items(), key=lambda entry: entry[1])
+    sequence = []
+    while end >= 0:
+        match = best_match[end][count]
+        if isinstance(match, tuple):
+            start = match[0]
+            mask = 0
+            for character_class in classes[start:end + 1]:
+                mask |= character_class
+            match = {"pattern": "bruteforce", "i": start, "j": end, "token": password[start:end + 1],
+                     "guesses": _bruteforce_guesses(mask, end - start + 1, length)}
+        sequence.append(match)
+        end = match["i"] - 1
+        count -= 1
+    return guesses, sequence[::-1]
+
+
+# Character -> bit of its kind in _CLASS_SIZES, filled in as characters are seen
+_character_classes = {}
+# Bit mask of kinds -> brute-force alphabet size
+_ALPHABET_SIZES = [sum(size for bit, (_, size) in enumerate(_CLASS_SIZES) if mask & 1 << bit)
+                   for mask in range(1 << len(_CLASS_SIZES))]
+
+
+def _character_class(character):
+    bit = _character_classes.get(character)
+    if bit is None:
+        bit = next(1 << index for index, (pattern, _) in enumerate(_CLASS_SIZES) if pattern.match(character))
+        if len(_character_classes) < 4096:
+            _character_classes[character] = bit
+    return bit
+
+
+def _bruteforce_guesses(mask, token_length, password_length):
+    guesses = float(_ALPHABET_SIZES[mask]) ** token_length
+    if token_length == password_length:
+        return guesses
+    floor = MIN_SUBMATCH_GUESSES_SINGLE_CHAR if token_length == 1 else MIN_SUBMATCH_GUESSES_MULTI_CHAR
+    return max(guesses, floor + 1)
+
+
+# Example usage
+if __name__ == "__main__":
+    for password in ("Password1!", "P@ssw0rd", "qwerty123", "zxcvbnm", "aaaaaaaa", "abcabcabc", "13/05/1991",
+                     "correcthorsebatterystaple", "Tr0ub4dour&3", "kR8$vP2!qL9z"):
+        result = estimate(password)
+        patterns = " + ".join(match["pattern"] for match in result["sequence"])
+        print(f"{password:<28} score {result['score']}, 10^{result['guesses_log10']:.1f} guesses: {patterns}")
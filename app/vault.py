@@ -1,17 +1,44 @@
+import base64
+import contextlib
 import json
+import sqlite3
 import uuid
-from cryptography.fernet import Fernet
+from collections import deque
+from itertools import islice
+from encryptions import EncryptionManager
+from item_cache import DecryptedItemCache
+from search import VaultIndex
+from storage import JournalStorage, SQLiteStorage
+from vault_format import read_vault, save_vault_file
 
 class Vault:
-    def __init__(self, encryption_key):
+    def __init__(self, encryption_key, item_encryption="field", cache_size=0, cache_ttl=60, indexed_fields=(),
+                 searchable_fields=(), storage=None):
         """
         Initializes the vault with an encryption key.
 
         :param encryption_key: A key for encrypting/decrypting sensitive data.
+        :param item_encryption: How new items are encrypted: 'field' stores each field as its
+                                own Fernet token, 'item' seals all fields in one AES-GCM envelope.
+        :param cache_size: Number of decrypted items retrieve_item keeps in memory. 0 disables caching.
+        :param cache_ttl: Seconds a decrypted item stays cached.
+        :param indexed_fields: Names of fields to blind index for find() (e.g. 'url', 'username').
+        :param searchable_fields: Names of fields to trigram index for search() (e.g. 'name', 'url').
+        :param storage: Where items are kept: any MutableMapping of item ID -> stored item
+                        (see storage.py). Defaults to an in-memory dict.
+
+        The vault's metadata, such as the parameters its key was derived with,
+        is kept in `header` and saved along with the items.
         """
+        if item_encryption not in ("field", "item"):
+            raise ValueError(f"Unknown item encryption mode: {item_encryption}.")
         self.encryption_key = encryption_key
-        self.fernet = Fernet(encryption_key)
-        self.data = {}
+        self.item_encryption = item_encryption
+        self.encryption_manager = EncryptionManager(encryption_key)
+        self.cache = DecryptedItemCache(cache_size, cache_ttl)
+        self.index = VaultIndex(self.encryption_manager, indexed_fields, searchable_fields)
+        self.data = {} if storage is None else storage
+        self.header = dict(getattr(storage, "header", {}))
 
     def create_item(self, item_type, fields):
         """
@@ -20,26 +47,64 @@ class Vault:
         :param item_type: The type of the item (e.g., 'Login', 'Credit Card').
         :param fields: A dictionary of fields (e.g., username, password, etc.).
         :return: The ID of the created item.
+        :raises ValueError: If a field value is not a string.
         """
         item_id = str(uuid.uuid4())
-        encrypted_fields = {key: self.encrypt(value) for key, value in fields.items()}
-        self.data[item_id] = {"type": item_type, "fields": encrypted_fields}
+        self.data[item_id] = item = self._encrypt_item(item_id, item_type, fields)
+        self.index.add(item_id, item)
         print(f"Item created: {item_id}")
         return item_id
 
+    def create_items(self, items):
+        """
+        Creates many items at once: values are encrypted in one batch and written
+        to storage in one go (a single transaction for SQLite).
+
+        :param items: An iterable of (item_type, fields) pairs.
+        :return: The IDs of the created items, in input order.
+        :raises ValueError: If a field value is not a string.
+        """
+        items = [(str(uuid.uuid4()), item_type, fields) for item_type, fields in items]
+        item_ids = [item_id for item_id, _, _ in items]
+        stored_items = list(zip(item_ids, self._encrypt_items(items)))
+        with self.batch():
+            if hasattr(self.data, "update_many"):
+                self.data.update_many(stored_items)
+            else:
+                self.data.update(stored_items)
+        for item_id, item in stored_items:
+            self.index.add(item_id, item)
+        return item_ids
+
     def modify_item(self, item_id, fields):
         """
         Modifies an existing item in the vault.
 
         :param item_id: The ID of the item to modify.
         :param fields: A dictionary of fields to update.
+        :raises KeyError: If the item is not in the vault.
+        :raises ValueError: If a field value is not a string.
         """
-        if item_id not in self.data:
-            print(f"Item {item_id} not found.")
-            return
-
-        encrypted_fields = {key: self.encrypt(value) for key, value in fields.items()}
-        self.data[item_id]["fields"].update(encrypted_fields)
+        _check_fields(fields)
+        item = self.data[item_id]
+        if "envelope" in item:
+            # Envelopes are sealed as a whole, so reseal with the updated fields
+            updated_fields = _decrypt_item(self.encryption_manager, item_id, item)["fields"]
+            updated_fields.update(fields)
+            item = self._encrypt_item(item_id, item["type"], updated_fields, "item")
+        else:
+            # Update a copy so a snapshot holding the old item never sees a half-applied change
+            encrypted_fields = dict(zip(fields.keys(), self.encrypt_many(fields.values())))
+            item = dict(item, fields={**item["fields"], **encrypted_fields})
+            blind_tokens = self.index.tokens_for(fields)
+            if blind_tokens:
+                item["blind"] = {**item.get("blind", {}), **blind_tokens}
+            if any(name in self.index.searchable_fields for name in fields):
+                # Trigrams cover all searchable fields, so they need the full item
+                item["grams"] = self.index.grams_for(_decrypt_item(self.encryption_manager, item_id, item)["fields"])
+        self.data[item_id] = item
+        self.cache.invalidate(item_id)
+        self.index.add(item_id, item)
         print(f"Item {item_id} updated.")
 
     def delete_item(self, item_id):
@@ -47,12 +112,12 @@ class Vault:
         Deletes an item from the vault.
 
         :param item_id: The ID of the item to delete.
+        :raises KeyError: If the item is not in the vault.
         """
-        if item_id in self.data:
-            del self.data[item_id]
-            print(f"Item {item_id} deleted.")
-        else:
-            print(f"Item {item_id} not found.")
+        del self.data[item_id]
+        self.cache.invalidate(item_id)
+        self.index.remove(item_id)
+        print(f"Item {item_id} deleted.")
 
     def retrieve_item(self, item_id):
         """
@@ -61,13 +126,67 @@ class Vault:
         :param item_id: The ID of the item to retrieve.
         :return: The decrypted item or None if the item is not found.
         """
-        if item_id not in self.data:
+        item = self.cache.get(item_id)
+        if item is not None:
+            return item
+
+        stored_item = self.data.get(item_id)
+        if stored_item is None:
             print(f"Item {item_id} not found.")
             return None
+        item = _decrypt_item(self.encryption_manager, item_id, stored_item)
+        self.cache.put(item_id, item)
+        return item
 
-        item = self.data[item_id]
-        decrypted_fields = {key: self.decrypt(value) for key, value in item["fields"].items()}
-        return {"type": item["type"], "fields": decrypted_fields}
+    def retrieve_items(self, item_ids, workers=None, chunk_size=500):
+        """
+        Retrieves and decrypts several items. IDs that are not in the vault are skipped.
+
+        :param item_ids: An iterable of item IDs.
+        :param workers: Number of worker processes to decrypt with. None or 1 decrypts in this process.
+        :param chunk_size: Number of items handed to a worker at a time.
+        :return: A dictionary of item ID -> decrypted item.
+        """
+        return dict(self.iter_decrypted_items(item_ids, workers, chunk_size))
+
+    def decrypt_all(self, workers=None, chunk_size=500):
+        """
+        Decrypts every item in the vault.
+
+        :param workers: Number of worker processes to decrypt with. None or 1 decrypts in this process.
+        :param chunk_size: Number of items handed to a worker at a time.
+        :return: A dictionary of item ID -> decrypted item.
+        """
+        return self.retrieve_items(list(self.data), workers, chunk_size)
+
+    def iter_decrypted_items(self, item_ids, workers=None, chunk_size=500):
+        """
+        Yields (item_id, decrypted item) pairs, sharding the work across a process
+        pool when `workers` is greater than 1. Each worker builds its own Fernet
+        instance from the vault's encryption key.
+
+        :param item_ids: An iterable of item IDs. IDs not in the vault are skipped.
+        :param workers: Number of worker processes. None or 1 decrypts in this process.
+        :param chunk_size: Number of items handed to a worker at a time.
+        """
+        chunks = _chunked(((item_id, self.data[item_id]) for item_id in item_ids if item_id in self.data), chunk_size)
+        if not workers or workers <= 1:
+            for chunk in chunks:
+                yield from _decrypt_chunk(chunk, self.encryption_manager)
+            return
+
+        # Imported here: multiprocessing is slow to load and most calls never need it
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.encryption_key,)) as executor:
+            # Keep only a few chunks in flight, so a slow consumer never has the
+            # whole vault's plaintext piling up in finished futures
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_decrypt_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
 
     def list_items(self):
         """
@@ -75,8 +194,18 @@ class Vault:
 
         :return: A list of item IDs and types.
         """
+        if hasattr(self.data, "item_types"):
+            # Storage that can list types without decoding every item
+            return [{"id": item_id, "type": item_type} for item_id, item_type in self.data.item_types()]
         return [{"id": item_id, "type": item["type"]} for item_id, item in self.data.items()]
 
+    @property
+    def fernet(self):
+        """
+        The vault's Fernet instance, built on first use.
+        """
+        return self.encryption_manager.fernet
+
     def encrypt(self, plaintext):
         """
         Encrypts plaintext data.
@@ -95,34 +224,329 @@ class Vault:
         """
         return self.fernet.decrypt(ciphertext.encode()).decode()
 
-    def save_to_file(self, file_path):
+    def find(self, type=None, **fields):
+        """
+        Finds items by type and/or exact values of blind-indexed fields, without
+        decrypting any item. URLs match on host name, other values ignore case.
+
+        Example: vault.find(type="Login", url="example.com")
+
+        :param type: The item type to match, or None for any type.
+        :param fields: Indexed field names and the values to match.
+        :return: A list of matching item IDs.
+        """
+        if not self.index.ready:
+            self.index.build(self.data)
+        return self.index.find(type, fields)
+
+    def search(self, query, limit=10, min_score=0.5):
+        """
+        Fuzzy searches the searchable fields for partial text, without decrypting
+        any item.
+
+        :param query: The (partial) text to look for, e.g. 'exmple'.
+        :param limit: Maximum number of item IDs returned.
+        :param min_score: Minimum fraction of the query's trigrams an item must contain.
+        :return: A list of item IDs, best match first.
+        """
+        if not self.index.ready:
+            self.index.build(self.data)
+        return self.index.search(query, limit, min_score)
+
+    def reindex(self):
+        """
+        Recomputes the blind index and trigram tokens of every item, e.g. after
+        changing `indexed_fields` or `searchable_fields`. This decrypts the whole vault once.
+        """
+        for item_id, decrypted in self.iter_decrypted_items(list(self.data)):
+            self.data[item_id] = self._reindexed(self.data[item_id], decrypted["fields"])
+        self.index.build(self.data)
+
+    def _reindexed(self, item, fields):
+        """
+        Builds a copy of a stored item with fresh blind index and trigram tokens.
+        The stored item itself is left as is, since a snapshot may still hold it.
+
+        :param item: The stored item.
+        :param fields: Its decrypted fields.
+        :return: The new stored item.
+        """
+        item = {key: value for key, value in item.items() if key not in ("blind", "grams")}
+        blind_tokens = self.index.tokens_for(fields)
+        if blind_tokens:
+            item["blind"] = blind_tokens
+        grams = self.index.grams_for(fields)
+        if grams:
+            item["grams"] = grams
+        return item
+
+    def migrate_item_encryption(self, item_encryption="item"):
+        """
+        Re-encrypts every item that is not yet in the given mode, e.g. to move a
+        vault of per-field Fernet tokens to per-item envelopes. New items use the
+        same mode afterwards.
+
+        :param item_encryption: The target mode, 'field' or 'item'.
+        :return: The number of items re-encrypted.
+        """
+        if item_encryption not in ("field", "item"):
+            raise ValueError(f"Unknown item encryption mode: {item_encryption}.")
+
+        migrated = sum(self._migrate_item(item_id, item_encryption) for item_id in list(self.data))
+        self.item_encryption = item_encryption
+        print(f"{migrated} items migrated to '{item_encryption}' encryption.")
+        return migrated
+
+    def _migrate_item(self, item_id, item_encryption):
+        """
+        Re-encrypts one item in the given mode unless it already uses it.
+
+        :param item_id: The ID of the item.
+        :param item_encryption: The target mode, 'field' or 'item'.
+        :return: True if the item was re-encrypted.
+        """
+        item = self.data.get(item_id)
+        if item is None or ("envelope" in item) == (item_encryption == "item"):
+            return False
+        fields = _decrypt_item(self.encryption_manager, item_id, item)["fields"]
+        self.data[item_id] = self._encrypt_item(item_id, item["type"], fields, item_encryption)
+        return True
+
+    def change_key(self, encryption_key, header=None):
+        """
+        Re-encrypts every item under a new key, e.g. after the master password
+        or its key derivation cost changed. Items are written back together with
+        the new header in one atomic step where the storage supports it.
+
+        :param encryption_key: The new key.
+        :param header: The new vault metadata. Defaults to the current header.
+        :return: The number of items re-encrypted.
+        """
+        decrypted = list(self.iter_decrypted_items(list(self.data)))
+        previous = self.encryption_key, self.encryption_manager, self.index
+        self.encryption_key = encryption_key
+        self.encryption_manager = EncryptionManager(encryption_key)
+        # Blind index and trigram tokens are keyed too
+        self.index = VaultIndex(self.encryption_manager, self.index.indexed_fields, self.index.searchable_fields)
+        try:
+            stored_items = zip([item_id for item_id, _ in decrypted],
+                               self._encrypt_items([(item_id, item["type"], item["fields"]) for item_id, item in decrypted]))
+            header = self.header if header is None else header
+            if hasattr(self.data, "rewrite"):
+                self.data.rewrite(stored_items, header)
+            else:
+                self.data.update(stored_items)
+            self.header = dict(header)
+        except BaseException:
+            self.encryption_key, self.encryption_manager, self.index = previous
+            raise
+        self.cache.clear()
+        # The old index caches trigram tokens under the old key
+        previous[2].reset()
+        print(f"{len(decrypted)} items re-encrypted under the new key.")
+        return len(decrypted)
+
+    def set_header(self, header):
+        """
+        Replaces the vault metadata, writing it to storage right away where the
+        storage keeps its own copy.
+
+        :param header: A dictionary of metadata.
+        """
+        self.header = dict(header)
+        if hasattr(self.data, "set_header"):
+            self.data.set_header(self.header)
+
+    def _encrypt_item(self, item_id, item_type, fields, item_encryption=None):
+        """
+        Builds the stored form of an item.
+
+        :param item_id: The ID of the item (bound to the envelope in 'item' mode).
+        :param item_type: The type of the item.
+        :param fields: A dictionary of plaintext fields.
+        :param item_encryption: The mode to use. Defaults to the vault's mode.
+        """
+        return self._encrypt_items([(item_id, item_type, fields)], item_encryption)[0]
+
+    def _encrypt_items(self, items, item_encryption=None):
+        """
+        Builds the stored form of several items. In 'field' mode the values of
+        all items are encrypted in a single batch.
+
+        :param items: A list of (item_id, item_type, fields) tuples.
+        :param item_encryption: The mode to use. Defaults to the vault's mode.
+        :return: A list of stored items, in input order.
+        """
+        # Checked up front so both modes accept the same items
+        for _, _, fields in items:
+            _check_fields(fields)
+        item_encryption = item_encryption or self.item_encryption
+        if item_encryption == "field":
+            tokens = iter(self.encrypt_many([value for _, _, fields in items for value in fields.values()]))
+
+        stored_items = []
+        for item_id, item_type, fields in items:
+            if item_encryption == "item":
+                envelope = self.encryption_manager.seal_fields(fields, item_id.encode())
+                item = {"type": item_type, "envelope": base64.urlsafe_b64encode(envelope).decode()}
+            else:
+                item = {"type": item_type, "fields": {name: next(tokens) for name in fields}}
+            blind_tokens = self.index.tokens_for(fields)
+            if blind_tokens:
+                item["blind"] = blind_tokens
+            grams = self.index.grams_for(fields)
+            if grams:
+                item["grams"] = grams
+            stored_items.append(item)
+        return stored_items
+
+    def encrypt_many(self, values):
+        """
+        Encrypts several plaintext values in one call.
+
+        :param values: An iterable of plaintext strings or bytes.
+        :return: A list of encrypted strings, in input order.
+        """
+        return [token.decode() for token in self.encryption_manager.encrypt_many(values)]
+
+    def decrypt_many(self, values):
+        """
+        Decrypts several encrypted values in one call.
+
+        :param values: An iterable of encrypted strings or bytes.
+        :return: A list of decrypted strings, in input order.
+        """
+        return [plaintext.decode() for plaintext in self.encryption_manager.decrypt_many(values)]
+
+    def save_to_file(self, file_path, format="json"):
         """
         Saves the vault data to a file.
 
         :param file_path: The path of the file to save to.
+        :param format: 'json', or 'binary' for a file that can be opened lazily.
         """
-        with open(file_path, "w") as file:
-            json.dump(self.data, file)
+        self.data = save_vault_file(file_path, self.data, format, self.header)
         print(f"Vault saved to {file_path}.")
 
     def load_from_file(self, file_path):
         """
-        Loads the vault data from a file.
+        Loads the vault data from a file. Binary files are memory-mapped and
+        items are only decoded when first accessed.
 
         :param file_path: The path of the file to load from.
         """
         try:
-            with open(file_path, "r") as file:
-                self.data = json.load(file)
+            self.data, self.header = read_vault(file_path)
+            self.cache.clear()
+            self.index.reset()
             print(f"Vault loaded from {file_path}.")
         except FileNotFoundError:
             print(f"File {file_path} not found.")
-        except json.JSONDecodeError:
+        except (json.JSONDecodeError, ValueError):
+            print(f"Invalid vault file format: {file_path}.")
+
+    def open_journal(self, file_path, journal_path=None, compact_every=1000, format=None):
+        """
+        Loads the vault from a snapshot file and keeps it journaled: every
+        create/modify/delete is appended to a journal file and fsync'd right away.
+
+        :param file_path: The path of the snapshot file.
+        :param journal_path: The path of the journal file. Defaults to '<file_path>.journal'.
+        :param compact_every: Number of journal records that triggers a compaction into the snapshot.
+        :param format: Snapshot format ('json' or 'binary'). Defaults to the format of the existing file.
+        """
+        try:
+            self.data = JournalStorage(file_path, journal_path, compact_every, format)
+            self.header = dict(self.data.header)
+            self.cache.clear()
+            self.index.reset()
+            print(f"Vault loaded from {file_path}.")
+        except (json.JSONDecodeError, ValueError):
             print(f"Invalid vault file format: {file_path}.")
 
+    def batch(self):
+        """
+        Groups the writes made inside a `with vault.batch():` block, so storage
+        that supports it does one fsync or transaction instead of one per item.
+        """
+        if hasattr(self.data, "batch"):
+            return self.data.batch()
+        return contextlib.nullcontext()
+
+    def open_database(self, db_path):
+        """
+        Keeps the vault in an SQLite database: every create/modify/delete is
+        committed right away and items are read from disk on demand.
+
+        :param db_path: The path of the database file.
+        """
+        try:
+            self.data = SQLiteStorage(db_path)
+            self.header = dict(self.data.header)
+            self.cache.clear()
+            self.index.reset()
+            print(f"Vault opened from {db_path}.")
+        except sqlite3.DatabaseError:
+            print(f"Invalid vault database: {db_path}.")
+
+    def compact(self):
+        """
+        Folds the storage's log (journal or WAL) into its main file. Does nothing
+        for storage without one.
+        """
+        if hasattr(self.data, "compact"):
+            self.data.compact()
+
+    def close(self):
+        """
+        Flushes and closes the vault's storage, wipes cached decrypted items and
+        drops the indexes.
+        """
+        self.cache.clear()
+        self.index.reset()
+        if hasattr(self.data, "close"):
+            self.data.close()
+
+
+def _check_fields(fields):
+    for name, value in fields.items():
+        if not isinstance(value, str):
+            raise ValueError(f"The value of field '{name}' must be a string.")
+
+
+def _decrypt_item(encryption_manager, item_id, item):
+    if "envelope" in item:
+        envelope = base64.urlsafe_b64decode(item["envelope"])
+        return {"type": item["type"], "fields": encryption_manager.open_fields(envelope, item_id.encode())}
+    fields = item["fields"]
+    decrypted = encryption_manager.decrypt_many(fields.values())
+    return {"type": item["type"], "fields": {key: value.decode() for key, value in zip(fields.keys(), decrypted)}}
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# Encryption manager of a decryption worker process, set by _init_worker
+_worker_manager = None
+
+
+def _init_worker(encryption_key):
+    global _worker_manager
+    _worker_manager = EncryptionManager(encryption_key)
+
+
+def _decrypt_chunk(chunk, encryption_manager=None):
+    encryption_manager = encryption_manager or _worker_manager
+    return [(item_id, _decrypt_item(encryption_manager, item_id, item)) for item_id, item in chunk]
+
 
 # Example usage
 if __name__ == "__main__":
+    from cryptography.fernet import Fernet
+
     # Generate a key for encryption (use a secure storage mechanism for real apps)
     key = Fernet.generate_key()
     vault = Vault(key)
@@ -140,6 +564,10 @@ if __name__ == "__main__":
     # List all items
     print("Vault items:", vault.list_items())
 
+    # Move the vault to one AES-GCM envelope per item
+    vault.migrate_item_encryption("item")
+    print("Retrieved after migration:", vault.retrieve_item(item_id))
+
     # Delete the item
     vault.delete_item(item_id)
 
@@ -0,0 +1,329 @@
+import base64
+import json
+import mmap
+import os
+import struct
+from collections.abc import MutableMapping
+
+# Binary vault layout:
+#   header   magic, format version, then (version 3+) a length-prefixed JSON object
+#            of vault metadata such as the key derivation parameters
+#   records  one encoded item per record, back to back
+#   index    per item: id, type, record offset, record length
+#   trailer  offset of the index, number of items
+#
+# Version 1 records are the item as JSON. Version 2 records are a list of
+# sections (tag, name, length-prefixed value) holding raw ciphertext instead of
+# base64 text: one per Fernet field token, one for an item envelope, and JSON
+# sections for any other item keys. Version 3 only adds the metadata header.
+#
+# JSON vault files are a plain object of item ID -> item, or, when the vault has
+# metadata, {"header": {...}, "items": {...}}.
+MAGIC = b"MYPV"
+VERSION = 3
+_HEADER = struct.Struct(">4sH")
+_METADATA = struct.Struct(">I")
+_TRAILER = struct.Struct(">QI")
+_ENTRY = struct.Struct(">QI")
+_STRING = struct.Struct(">H")
+_VALUE = struct.Struct(">BI")
+
+_SECTION_JSON = 0
+_SECTION_FIELD = 1
+_SECTION_ENVELOPE = 2
+
+
+class MappedVaultData(MutableMapping):
+    def __init__(self, file_path):
+        """
+        Opens a binary vault file without decoding its items.
+
+        Only the item ID -> (offset, length, type) index and the metadata header
+        are read up front. An item is decoded from the memory-mapped file the
+        first time it is accessed, so opening the vault costs the same whatever
+        the size of the items.
+
+        :param file_path: The path of the binary vault file.
+        """
+        self.file_path = file_path
+        self._file = open(file_path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._index = self._read_index()
+        except (ValueError, struct.error):
+            self.close()
+            raise ValueError(f"Invalid binary vault file: {file_path}.")
+        self._loaded = {}
+
+    def __getitem__(self, item_id):
+        if item_id in self._loaded:
+            return self._loaded[item_id]
+        offset, length, item_type = self._index[item_id]
+        record = self._map[offset:offset + length]
+        item = decode_record(record, item_type) if self.version >= 2 else json.loads(record)
+        self._loaded[item_id] = item
+        return item
+
+    def __setitem__(self, item_id, item):
+        # The on-disk record is stale from now on
+        self._index.pop(item_id, None)
+        self._loaded[item_id] = item
+
+    def __delitem__(self, item_id):
+        found = self._index.pop(item_id, None) is not None
+        found = self._loaded.pop(item_id, None) is not None or found
+        if not found:
+            raise KeyError(item_id)
+
+    def __iter__(self):
+        yield from self._index
+        for item_id in self._loaded:
+            if item_id not in self._index:
+                yield item_id
+
+    def __len__(self):
+        return len(self._index) + len(self._loaded.keys() - self._index.keys())
+
+    def __contains__(self, item_id):
+        return item_id in self._index or item_id in self._loaded
+
+    def item_types(self):
+        """
+        Yields (item_id, item_type) pairs without decoding unchanged items.
+        """
+        for item_id, (_, _, item_type) in self._index.items():
+            yield item_id, item_type
+        for item_id, item in self._loaded.items():
+            if item_id not in self._index:
+                yield item_id, item["type"]
+
+    def raw_record(self, item_id):
+        """
+        Returns the encoded record and type of an unchanged item, or None if the
+        item was added or modified since the file was opened or the file uses an
+        older record encoding.
+
+        :param item_id: The ID of the item.
+        """
+        entry = self._index.get(item_id)
+        if entry is None or self.version < 2:
+            return None
+        offset, length, item_type = entry
+        return self._map[offset:offset + length], item_type
+
+    def close(self):
+        """
+        Unmaps and closes the underlying file.
+        """
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _read_index(self):
+        magic, self.version = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or not 1 <= self.version <= VERSION:
+            raise ValueError("Unsupported vault file header.")
+        self.header = {}
+        if self.version >= 3:
+            (length,) = _METADATA.unpack_from(self._map, _HEADER.size)
+            start = _HEADER.size + _METADATA.size
+            self.header = json.loads(self._map[start:start + length])
+
+        index_offset, count = _TRAILER.unpack_from(self._map, len(self._map) - _TRAILER.size)
+        index = {}
+        position = index_offset
+        for _ in range(count):
+            item_id, position = _read_string(self._map, position)
+            item_type, position = _read_string(self._map, position)
+            offset, length = _ENTRY.unpack_from(self._map, position)
+            position += _ENTRY.size
+            index[item_id] = (offset, length, item_type)
+        return index
+
+
+def encode_record(item):
+    """
+    Encodes an item (without its type) as a version 2 record.
+
+    :param item: The stored form of an item.
+    :return: The record (bytes).
+    """
+    parts = []
+    for key, value in item.items():
+        if key == "type":
+            continue
+        if key == "fields":
+            for name, token in value.items():
+                parts.append(_pack_section(_SECTION_FIELD, name, base64.urlsafe_b64decode(token)))
+        elif key == "envelope":
+            parts.append(_pack_section(_SECTION_ENVELOPE, "", base64.urlsafe_b64decode(value)))
+        else:
+            parts.append(_pack_section(_SECTION_JSON, key, json.dumps(value, separators=(",", ":")).encode("utf-8")))
+    return b"".join(parts)
+
+
+def decode_record(record, item_type):
+    """
+    Decodes a version 2 record back into the stored form of an item.
+
+    :param record: The record (bytes).
+    :param item_type: The type of the item, kept in the index.
+    """
+    item = {"type": item_type}
+    fields = {}
+    position = 0
+    while position < len(record):
+        tag, length = _VALUE.unpack_from(record, position)
+        name, position = _read_string(record, position + _VALUE.size)
+        value = record[position:position + length]
+        position += length
+        if tag == _SECTION_FIELD:
+            fields[name] = base64.urlsafe_b64encode(value).decode()
+        elif tag == _SECTION_ENVELOPE:
+            item["envelope"] = base64.urlsafe_b64encode(value).decode()
+        else:
+            item[name] = json.loads(value)
+    if "envelope" not in item:
+        item["fields"] = fields
+    return item
+
+
+def is_binary_file(file_path):
+    """
+    Checks whether a file starts with the binary vault magic bytes.
+
+    :param file_path: The path of the file to check.
+    """
+    with open(file_path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def read_vault_file(file_path):
+    """
+    Opens a vault file, detecting its format.
+
+    :param file_path: The path of the vault file.
+    :return: A MappedVaultData for binary files, a dict for JSON files.
+    """
+    return read_vault(file_path)[0]
+
+
+def read_vault(file_path):
+    """
+    Opens a vault file and its metadata header, detecting its format.
+
+    :param file_path: The path of the vault file.
+    :return: A tuple (items, header): a MappedVaultData or a dict, and a dict of metadata.
+    """
+    if is_binary_file(file_path):
+        items = MappedVaultData(file_path)
+        return items, items.header
+    with open(file_path, "r", encoding="utf-8") as file:
+        data = json.load(file)
+    if data.keys() == {"header", "items"}:
+        return data["items"], data["header"]
+    return data, {}
+
+
+def save_vault_file(file_path, items, format="json", header=None):
+    """
+    Atomically writes items to a vault file.
+
+    :param file_path: The path of the file to write.
+    :param items: A mapping of item IDs to items.
+    :param format: 'json' or 'binary'.
+    :param header: Optional dictionary of vault metadata stored with the items.
+    :return: The mapping that should hold the items from now on. A mapped vault
+             is reopened on the new file, anything else is returned unchanged.
+    """
+    if format not in ("json", "binary"):
+        raise ValueError(f"Unknown vault file format: {format}.")
+
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "wb") as file:
+        if format == "binary":
+            _write_binary(file, items, header or {})
+        elif header:
+            file.write(json.dumps({"header": header, "items": dict(items)}).encode("utf-8"))
+        else:
+            file.write(json.dumps(dict(items)).encode("utf-8"))
+        file.flush()
+        os.fsync(file.fileno())
+
+    if isinstance(items, MappedVaultData):
+        # A mapped file cannot be replaced while it is still open on Windows
+        items.close()
+        os.replace(temp_path, file_path)
+        return read_vault_file(file_path)
+    os.replace(temp_path, file_path)
+    return items
+
+
+def _write_binary(file, items, header):
+    metadata = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    file.write(_HEADER.pack(MAGIC, VERSION) + _METADATA.pack(len(metadata)) + metadata)
+    offset = _HEADER.size + _METADATA.size + len(metadata)
+    entries = []
+    for item_id in items:
+        raw = items.raw_record(item_id) if isinstance(items, MappedVaultData) else None
+        if raw is None:
+            item = items[item_id]
+            record = encode_record(item)
+            item_type = item["type"]
+        else:
+            record, item_type = raw
+        file.write(record)
+        entries.append((item_id, item_type, offset, len(record)))
+        offset += len(record)
+
+    index_offset = offset
+    for item_id, item_type, record_offset, length in entries:
+        file.write(_pack_string(item_id))
+        file.write(_pack_string(item_type))
+        file.write(_ENTRY.pack(record_offset, length))
+    file.write(_TRAILER.pack(index_offset, len(entries)))
+
+
+def convert_vault_file(source_path, target_path, format):
+    """
+    Converts a vault file between the JSON and binary formats.
+
+    :param source_path: The path of the vault file to read (format is detected).
+    :param target_path: The path of the file to write.
+    :param format: The target format, 'json' or 'binary'.
+    """
+    items, header = read_vault(source_path)
+    items = save_vault_file(target_path, items, format, header)
+    if isinstance(items, MappedVaultData):
+        items.close()
+
+
+def _pack_section(tag, name, value):
+    return _VALUE.pack(tag, len(value)) + _pack_string(name) + value
+
+
+def _pack_string(value):
+    encoded = value.encode("utf-8")
+    return _STRING.pack(len(encoded)) + encoded
+
+
+def _read_string(buffer, position):
+    (length,) = _STRING.unpack_from(buffer, position)
+    start = position + _STRING.size
+    return str(buffer[start:start + length], "utf-8"), start + length
+
+
+# Example usage
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a vault file between the JSON and binary formats.")
+    parser.add_argument("source", help="vault file to read")
+    parser.add_argument("target", help="vault file to write")
+    parser.add_argument("--format", choices=("json", "binary"), default="binary", help="target format")
+    args = parser.parse_args()
+
+    convert_vault_file(args.source, args.target, args.format)
+    print(f"{args.source} ({os.path.getsize(args.source)} bytes) -> "
+          f"{args.target} ({os.path.getsize(args.target)} bytes, {args.format})")
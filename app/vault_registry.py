@@ -0,0 +1,252 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent_vault import ConcurrentVault
+from kdf import DEFAULT_SCRYPT_COST, derive_key, key_check, new_kdf_params
+from storage import SQLiteStorage
+
+
+class VaultRegistry:
+    def __init__(self, vault_dir, max_open=256, memory_budget=256 * 1024 * 1024, cache_kib=256, kdf_cost=None,
+                 **vault_options):
+        """
+        Opens the vaults of many users in one process.
+
+        Each user's vault is an SQLite database in `vault_dir`, opened on first
+        use and kept open while it is used. When more than `max_open` vaults are
+        open, or their memory passes `memory_budget`, the least recently used
+        ones are closed. The memory counted for a vault is its SQLite page cache
+        limit plus the bytes held by its decrypted-item cache, kept as a running
+        total. sweep() also closes the vaults whose session was locked or timed
+        out. A vault is never closed while it is in use.
+
+        Vaults are ConcurrentVaults, so threads using the same user's vault at
+        the same time are safe, and the registry itself can be shared between
+        threads.
+
+        :param vault_dir: The directory holding the vault databases.
+        :param max_open: Maximum number of vaults kept open.
+        :param memory_budget: Memory the open vaults may use, in bytes.
+        :param cache_kib: SQLite page cache of each vault, in KiB.
+        :param kdf_cost: scrypt cost for the master password of new vaults. Defaults to kdf.DEFAULT_SCRYPT_COST.
+        :param vault_options: Any other Vault option (item_encryption, cache_size, ...).
+        """
+        self.vault_dir = vault_dir
+        self.max_open = max_open
+        self.memory_budget = memory_budget
+        self.cache_kib = cache_kib
+        self.kdf_cost = dict(kdf_cost or DEFAULT_SCRYPT_COST)
+        self.vault_options = vault_options
+        self._vaults = OrderedDict()
+        self._memory = 0
+        # Users whose vault is being created -> the key derivation parameters all their unlocks use
+        self._new_kdf_params = {}
+        # Reentrant: closing a vault under the lock reports its emptied cache back to _cache_resized
+        self._lock = threading.RLock()
+        os.makedirs(vault_dir, exist_ok=True)
+
+    def unlock(self, session, master_password):
+        """
+        Unlocks the vault of a logged-in user, creating it on first use.
+
+        :param session: The user's UserSession, after login.
+        :param master_password: The user's master password.
+        :return: An unlock token for use().
+        """
+        user = _user_key(session)
+        storage = SQLiteStorage(self._vault_path(session), cache_kib=self.cache_kib)
+        try:
+            kdf_params = storage.header.get("kdf")
+            if kdf_params is None:
+                # Concurrent first unlocks share one salt; the slow derivation runs outside the lock
+                with self._lock:
+                    kdf_params = self._new_kdf_params.setdefault(user, new_kdf_params("scrypt", **self.kdf_cost))
+                check = key_check(derive_key(master_password, kdf_params))
+                with self._lock:
+                    # The first unlock to get here sets the master password; the others are checked against it
+                    header = storage.read_header()
+                    if "kdf" in header:
+                        kdf_params = header["kdf"]
+                    else:
+                        kdf_params = {**kdf_params, "check": check}
+                        storage.set_header({**header, "kdf": kdf_params})
+                    self._new_kdf_params.pop(user, None)
+        finally:
+            storage.close()
+        return session.unlock(master_password, kdf_params)
+
+    @contextmanager
+    def use(self, session, token):
+        """
+        Lends out a user's vault, opening it if needed, for the duration of the block.
+
+        :param session: The user's unlocked UserSession.
+        :param token: An unlock token of that session.
+        """
+        key = session.key_for(token)
+        user = _user_key(session)
+        entry = self._acquire(user, session)
+        if entry is None:
+            # Opened outside the lock, so other users don't wait on the database
+            storage = SQLiteStorage(self._vault_path(session), cache_kib=self.cache_kib)
+            vault = ConcurrentVault(key, storage=storage, **self.vault_options)
+            with self._lock:
+                entry = self._vaults.get(user)
+                if entry is None:
+                    entry = self._add(user, session, vault)
+                else:
+                    # Another thread opened it first
+                    entry.users += 1
+                    entry.session = session
+                    self._vaults.move_to_end(user)
+                    vault.close()
+                self._evict()
+        try:
+            yield entry.vault
+        finally:
+            with self._lock:
+                entry.users -= 1
+                self._evict()
+
+    def close_user(self, session):
+        """
+        Closes a user's vault if it is open and not in use, e.g. at logout.
+
+        :param session: The user's UserSession.
+        """
+        with self._lock:
+            entry = self._vaults.get(_user_key(session))
+            if entry is not None and not entry.users:
+                self._close(_user_key(session))
+
+    def sweep(self):
+        """
+        Closes the vaults of locked sessions and enforces the limits.
+        """
+        with self._lock:
+            for user, entry in list(self._vaults.items()):
+                if not entry.users and not entry.session.is_unlocked:
+                    self._close(user)
+            self._evict()
+
+    def memory_usage(self):
+        """
+        Returns the memory counted against `memory_budget`.
+
+        :return: The total, in bytes.
+        """
+        return self._memory
+
+    def __len__(self):
+        return len(self._vaults)
+
+    def close(self):
+        """
+        Closes every open vault.
+        """
+        with self._lock:
+            for user in list(self._vaults):
+                self._close(user)
+
+    def _acquire(self, user, session):
+        # Marks an open vault as in use and most recently used; None if it is not open
+        with self._lock:
+            entry = self._vaults.get(user)
+            if entry is not None:
+                entry.users += 1
+                entry.session = session
+                self._vaults.move_to_end(user)
+            return entry
+
+    def _add(self, user, session, vault):
+        entry = _OpenVault(session, vault)
+        entry.users = 1
+        entry.memory = self.cache_kib * 1024 + vault.cache.size
+        self._vaults[user] = entry
+        self._memory += entry.memory
+        vault.cache.on_resize = lambda delta: self._cache_resized(entry, delta)
+        return entry
+
+    def _cache_resized(self, entry, delta):
+        with self._lock:
+            if entry.vault.cache.on_resize is not None:
+                entry.memory += delta
+                self._memory += delta
+
+    def _evict(self):
+        # Oldest first; vaults in use are skipped
+        for user, entry in list(self._vaults.items()):
+            if len(self._vaults) <= self.max_open and self._memory <= self.memory_budget:
+                break
+            if not entry.users:
+                self._close(user)
+
+    def _close(self, user):
+        entry = self._vaults.pop(user)
+        entry.vault.cache.on_resize = None
+        self._memory -= entry.memory
+        entry.vault.close()
+
+    def _vault_path(self, session):
+        # Emails can hold characters that are not safe in file names
+        return os.path.join(self.vault_dir, hashlib.sha256(_user_key(session).encode()).hexdigest()[:32] + ".db")
+
+
+class _OpenVault:
+    def __init__(self, session, vault):
+        self.session = session
+        self.vault = vault
+        self.users = 0
+        # Bytes counted for this vault in the registry's total
+        self.memory = 0
+
+
+def _user_key(session):
+    if session.user is None:
+        raise ValueError("The session is not logged in.")
+    return session.user.strip().lower()
+
+
+# Example usage
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import random
+    import resource
+    import tempfile
+    import time
+    from auth import UserSession
+
+    with tempfile.TemporaryDirectory() as directory:
+        registry = VaultRegistry(directory, max_open=200, memory_budget=64 * 1024 * 1024, cache_kib=64,
+                                 kdf_cost={"n": 2 ** 10}, item_encryption="item", cache_size=8)
+        sessions = []
+        for n in range(2000):
+            session = UserSession()
+            session.user = f"user{n}@example.com"
+            sessions.append((session, registry.unlock(session, f"master-{n}")))
+            session.token_ttl = 3600
+
+        def client(writes):
+            for _ in range(writes):
+                session, token = random.choice(sessions)
+                with registry.use(session, token) as vault:
+                    item_id = vault.create_item("Login", {"username": session.user})
+                    vault.retrieve_item(item_id)
+
+        # Four threads, so the same user's vault is regularly used by two at once
+        threads = [threading.Thread(target=client, args=(5000,)) for _ in range(4)]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - start
+        print(f"2000 users: {20000 / elapsed:,.0f} writes/s, {len(registry)} vaults open, "
+              f"{registry.memory_usage() / 2 ** 20:.1f} MiB counted, "
+              f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+        registry.close()
+        print("Memory counted after closing every vault:", registry.memory_usage())